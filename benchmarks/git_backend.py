@@ -0,0 +1,71 @@
+"""Compare looking up refs and package trees by spawning a git process for
+each lookup, as done through gitpython commands, with the long-lived
+`git cat-file --batch-check` process and the refs read from `.git`.
+
+Usage: python benchmarks/git_backend.py [PACKAGES]
+"""
+from __future__ import annotations
+
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from monas.vcs import Git
+
+
+def create_repo(root: Path, count: int) -> list[str]:
+    paths = []
+    for index in range(count):
+        path = root / "packages" / f"package-{index}"
+        path.mkdir(parents=True)
+        path.joinpath("__init__.py").write_text(f"VERSION = {index}\n")
+        paths.append(f"packages/package-{index}")
+    git = ["git", "-c", "user.name=bench", "-c", "user.email=bench@example.org"]
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    subprocess.run(["git", "add", "."], cwd=root, check=True)
+    subprocess.run([*git, "commit", "-qm", "Initial commit"], cwd=root, check=True)
+    subprocess.run([*git, "tag", "-am", "0.1.0", "0.1.0"], cwd=root, check=True)
+    return paths
+
+
+def spawn_per_lookup(repo: Git, paths: list[str]) -> None:
+    git = repo.repo.git
+    git.rev_parse("--verify", "HEAD^{commit}")
+    git.rev_parse("--verify", "0.1.0^{commit}")
+    for path in paths:
+        git.rev_parse(f"HEAD:{path}")
+
+
+def batch_backend(repo: Git, paths: list[str]) -> None:
+    repo.resolve_commit("HEAD")
+    repo.resolve_commit("0.1.0")
+    repo.get_tree_ids("HEAD", paths)
+
+
+def measure(func: Callable[[Git, list[str]], None], root: Path, paths: list[str]):
+    repo = Git(root)
+    start = time.perf_counter()
+    func(repo, paths)
+    elapsed = time.perf_counter() - start
+    repo.close()
+    return elapsed
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        paths = create_repo(root, count)
+        spawned = measure(spawn_per_lookup, root, paths)
+        batched = measure(batch_backend, root, paths)
+    print(f"Packages:          {count}")
+    print(f"Process per call:  {spawned * 1000:10.1f} ms")
+    print(f"Batch process:     {batched * 1000:10.1f} ms")
+    print(f"Speedup:           {spawned / batched:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Compare the memory held per package by full metadata documents
+and by compact package records.
+
+Usage: python benchmarks/package_memory.py [COUNT]
+"""
+from __future__ import annotations
+
+import gc
+import sys
+import tempfile
+import textwrap
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+from tomlkit.toml_file import TOMLFile
+
+from monas.project import read_package_record
+
+PYPROJECT = textwrap.dedent(
+    """\
+    [project]
+    name = "package-{index}"
+    version = "0.1.0"
+    description = "Benchmark package {index}"
+    authors = [{{name = "John", email = "john@doe.me"}}]
+    license = {{text = "MIT"}}
+    requires-python = ">=3.8"
+    readme = "README.md"
+    dependencies = [
+        "click>=7",
+        "requests>=2.25",
+        "packaging>=20",
+        "package-{dependency}",
+    ]
+
+    [project.urls]
+    Home = "https://example.org/packages/package-{index}"
+
+    [build-system]
+    requires = ["pdm-backend"]
+    build-backend = "pdm.backend"
+    """
+)
+
+
+def create_packages(root: Path, count: int) -> list[Path]:
+    paths = []
+    for index in range(count):
+        path = root / f"package-{index}"
+        path.mkdir()
+        path.joinpath("pyproject.toml").write_text(
+            PYPROJECT.format(index=index, dependency=max(index - 1, 0))
+        )
+        paths.append(path)
+    return paths
+
+
+def measure(func: Callable[[Path], Any], paths: list[Path]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    held = [func(path) for path in paths]
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return current
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = create_packages(Path(tmpdir), count)
+        documents = measure(lambda p: TOMLFile(p / "pyproject.toml").read(), paths)
+        records = measure(read_package_record, paths)
+    print(f"Packages:         {count}")
+    print(f"tomlkit document: {documents / 1024:10.1f} KiB")
+    print(f"PackageRecord:    {records / 1024:10.1f} KiB")
+    print(f"Reduction:        {documents / records:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
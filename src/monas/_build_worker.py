@@ -0,0 +1,100 @@
+"""A long-lived worker calling the PEP 517 hooks of one build backend.
+
+It is run by the Python of a build environment, so it must only use the
+standard library and must not import monas. The backend is read from the
+``_MONAS_BUILD_BACKEND`` environment variable, and the in-tree backend paths
+from ``_MONAS_BACKEND_PATH_JSON``, relative to the package built, as a worker
+is only used for the hooks of one package.
+
+Requests are read from stdin as JSON lines of ``{"hook", "cwd", "kwargs"}``.
+The output of the backend goes to stdout, and each response is written on its
+own line after a ``RESPONSE_PREFIX``.
+"""
+import importlib
+import json
+import os
+import sys
+import traceback
+import warnings
+
+RESPONSE_PREFIX = "\x00monas-response:"
+HOOKS = (
+    "get_requires_for_build_wheel",
+    "build_wheel",
+    "get_requires_for_build_sdist",
+    "build_sdist",
+)
+
+
+class BackendUnavailable(Exception):
+    """Raised when the backend can't be imported"""
+
+
+def load_backend():
+    spec = os.environ["_MONAS_BUILD_BACKEND"]
+    backend_path = json.loads(os.environ.get("_MONAS_BACKEND_PATH_JSON", "[]"))
+    backend_path = [os.path.abspath(path) for path in backend_path]
+    sys.path[:0] = backend_path
+    mod_path, _, obj_path = spec.partition(":")
+    try:
+        obj = importlib.import_module(mod_path)
+    except ImportError:
+        raise BackendUnavailable(traceback.format_exc()) from None
+    if backend_path:
+        module_file = os.path.normcase(os.path.abspath(obj.__file__))
+        if not any(
+            module_file.startswith(os.path.normcase(path) + os.sep)
+            for path in backend_path
+        ):
+            raise BackendUnavailable(
+                f"The backend {spec} is not loaded from the backend-path"
+            )
+    for name in filter(None, obj_path.split(".")):
+        obj = getattr(obj, name)
+    return obj
+
+
+def call_hook(backend, hook, kwargs):
+    if hook.startswith("get_requires_for_build_"):
+        func = getattr(backend, hook, None)
+        # The hooks are optional and default to no extra requirement
+        return [] if func is None else func(**kwargs)
+    return getattr(backend, hook)(**kwargs)
+
+
+def main():
+    here = os.path.normcase(os.path.realpath(os.path.dirname(__file__)))
+    sys.path[:] = [
+        path for path in sys.path if os.path.normcase(os.path.realpath(path)) != here
+    ]
+    backend = None
+    for line in sys.stdin:
+        request = json.loads(line)
+        os.chdir(request["cwd"])
+        response = {"unsupported": False, "return_val": None}
+        with warnings.catch_warnings():
+            warnings.simplefilter("default")
+            try:
+                if request["hook"] not in HOOKS:
+                    raise ValueError(f"Unknown hook {request['hook']}")
+                if backend is None:
+                    backend = load_backend()
+                response["return_val"] = call_hook(
+                    backend, request["hook"], request["kwargs"]
+                )
+            except BackendUnavailable as e:
+                response["no_backend"] = True
+                response["traceback"] = str(e)
+            except (Exception, SystemExit) as e:
+                unsupported = getattr(backend, "UnsupportedOperation", None)
+                if isinstance(unsupported, type) and isinstance(e, unsupported):
+                    response["unsupported"] = True
+                response["error"] = True
+                response["traceback"] = traceback.format_exc()
+        sys.stderr.flush()
+        sys.stdout.write(f"\n{RESPONSE_PREFIX}{json.dumps(response)}\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
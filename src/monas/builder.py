@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator, NamedTuple, Tuple
+
+from monas._build_worker import RESPONSE_PREFIX
+from monas.config import Config
+from monas.project import PyPackage
+from monas.requirements import BuildSystem, get_build_system
+from monas.utils import (
+    Job,
+    current_job,
+    ensure_virtualenv,
+    get_install_stamp,
+    get_venv_python,
+    pip_install,
+    read_install_stamp,
+    run_sync,
+    write_install_stamp,
+)
+
+WORKER_SCRIPT = str(Path(__file__).with_name("_build_worker.py"))
+# Touched every time a build environment or cached artifact is used
+LAST_USED_FILE = ".monas-last-used"
+
+WorkerKey = Tuple[str, str, str, Tuple[str, ...]]
+
+
+class BuildError(Exception):
+    """Raised when a build hook fails"""
+
+
+def _normalize_requires(requires: Iterable[str]) -> list[str]:
+    return sorted({r.strip() for r in requires})
+
+
+def get_build_env_key(requires: Iterable[str]) -> str:
+    """Get a hash of the build requirements, with the Python version as
+    the build environments are created with the current interpreter.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(f"python:{sys.version_info[0]}.{sys.version_info[1]}\n".encode())
+    for req in _normalize_requires(requires):
+        hasher.update(f"req:{req}\n".encode())
+    return hasher.hexdigest()[:16]
+
+
+def _is_build_output(parts: tuple[str, ...]) -> bool:
+    """Whether the path, relative to the package, is the venv or written by
+    a build, which are often untracked but not ignored.
+    """
+    if parts[0] in (".venv", "build", "dist"):
+        return True
+    return any(part == "__pycache__" or part.endswith(".egg-info") for part in parts)
+
+
+class BuildWorker:
+    """A worker process calling the hooks of one backend in a build environment,
+    for one package.
+
+    Args:
+        python: The Python interpreter of the build environment
+        build_system: The build system the backend is loaded from
+    """
+
+    def __init__(self, python: Path, build_system: BuildSystem):
+        env = {
+            **os.environ,
+            "PYTHONUNBUFFERED": "1",
+            "_MONAS_BUILD_BACKEND": build_system.backend,
+        }
+        if build_system.backend_path:
+            env["_MONAS_BACKEND_PATH_JSON"] = json.dumps(build_system.backend_path)
+        self.process = subprocess.Popen(
+            [str(python), WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=env,
+            encoding="utf-8",
+            errors="replace",
+        )
+
+    def call(self, hook: str, cwd: Path, job: Job | None, **kwargs: Any) -> Any:
+        """Call the hook in the worker and return its result.
+
+        The output of the backend is streamed to the given job.
+        """
+        assert self.process.stdin is not None and self.process.stdout is not None
+        request = {"hook": hook, "cwd": str(cwd), "kwargs": kwargs}
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+        for line in self.process.stdout:
+            if line.startswith(RESPONSE_PREFIX):
+                response = json.loads(line[len(RESPONSE_PREFIX) :])
+                break
+            if job is not None and line.strip():
+                job.output.write(line)
+                job.status = line.strip()
+        else:
+            raise BuildError(
+                f"The build worker exited unexpectedly with code {self.process.wait()}"
+            )
+        if "traceback" in response:
+            if job is not None:
+                for line in response["traceback"].splitlines():
+                    job.output.write(line)
+            if response.get("unsupported"):
+                raise BuildError(f"{hook} is not supported by the backend")
+            raise BuildError(f"Error calling the {hook} hook")
+        return response["return_val"]
+
+    def close(self) -> None:
+        if self.process.stdin is not None:
+            self.process.stdin.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        if self.process.stdout is not None:
+            self.process.stdout.close()
+
+
+class WorkerPool:
+    """A bounded pool of build workers.
+
+    Workers are kept per build environment, backend and package, so the hooks of
+    one package reuse the worker, but the global state a backend like setuptools
+    leaves behind never leaks into the build of another package. An idle worker
+    of another key is stopped to make room when the pool is full.
+
+    Args:
+        size: The maximum number of workers
+    """
+
+    def __init__(self, size: int) -> None:
+        self._semaphore = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: dict[WorkerKey, list[BuildWorker]] = {}
+        self._count = 0
+        self._size = size
+
+    def _evict_idle(self) -> None:
+        for workers in self._idle.values():
+            if workers:
+                workers.pop(0).close()
+                self._count -= 1
+                return
+
+    @contextmanager
+    def acquire(
+        self, python: Path, build_system: BuildSystem, source_dir: Path
+    ) -> Iterator[BuildWorker]:
+        """Get a worker for the build system and package, which is returned to
+        the pool after use. A worker that failed is stopped, as its state is unknown.
+        """
+        key = (
+            str(python),
+            str(source_dir),
+            build_system.backend,
+            tuple(build_system.backend_path),
+        )
+        with self._semaphore:
+            with self._lock:
+                idle = self._idle.get(key)
+                worker = idle.pop() if idle else None
+                if worker is None:
+                    if self._count >= self._size:
+                        self._evict_idle()
+                    self._count += 1
+            try:
+                if worker is None:
+                    worker = BuildWorker(python, build_system)
+                yield worker
+            except BaseException:
+                if worker is not None:
+                    worker.close()
+                with self._lock:
+                    self._count -= 1
+                raise
+            with self._lock:
+                self._idle.setdefault(key, []).append(worker)
+
+    def retire(self, source_dir: Path) -> None:
+        """Stop the idle workers of the package, once it is built"""
+        with self._lock:
+            retired = [
+                worker
+                for key in list(self._idle)
+                if key[1] == str(source_dir)
+                for worker in self._idle.pop(key)
+            ]
+            self._count -= len(retired)
+        for worker in retired:
+            worker.close()
+
+    def close(self) -> None:
+        """Stop all workers"""
+        with self._lock:
+            for workers in self._idle.values():
+                for worker in workers:
+                    worker.close()
+            self._idle.clear()
+            self._count = 0
+
+
+class BuildResult(NamedTuple):
+    artifacts: list[Path]
+    #: Whether all artifacts are reused from the cache
+    cached: bool
+
+
+def _evict_stale(directory: Path, max_age: float) -> None:
+    """Remove the entries of the directory not used for max_age seconds"""
+    if not directory.is_dir():
+        return
+    now = time.time()
+    for path in directory.iterdir():
+        try:
+            last_used = path.joinpath(LAST_USED_FILE).stat().st_mtime
+        except OSError:
+            last_used = path.stat().st_mtime
+        if now - last_used > max_age:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class Builder:
+    """Build packages by calling the PEP 517 hooks in shared build environments.
+
+    Packages with the same build requirements share one build environment under
+    `.monas/build-envs`, which is kept across runs, so no venv is set up per
+    package. A build environment is keyed by the full set of requirements in it,
+    including the ones returned by the `get_requires_for_build_*` hooks, and is
+    never changed once provisioned, so a build never sees its environment change. The hooks of a package are called by one worker, see `WorkerPool`.
+
+    The built artifacts are cached under `.monas/artifacts`, keyed by a hash of
+    the source files and the build system, so unchanged packages are not rebuilt.
+    Build environments and artifacts unused for `max_age` seconds are removed.
+
+    Args:
+        config: The monas configuration
+        concurrency: The maximum number of build workers
+    """
+
+    max_age = 30 * 24 * 60 * 60
+
+    def __init__(self, config: Config, concurrency: int) -> None:
+        self.config = config
+        self.build_envs = config.path / ".monas" / "build-envs"
+        self.artifacts = config.path / ".monas" / "artifacts"
+        self.pool = WorkerPool(concurrency)
+        self._env_locks: dict[Path, asyncio.Lock] = {}
+        self._provisioned: set[Path] = set()
+
+    def __enter__(self) -> Builder:
+        self.evict_stale()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.pool.close()
+
+    def get_build_env(self, requires: Iterable[str]) -> Path:
+        """Get the path to the build environment of the build requirements"""
+        return self.build_envs / get_build_env_key(requires)
+
+    def evict_stale(self) -> None:
+        """Remove the build environments and artifacts not used for `max_age`
+        seconds
+        """
+        _evict_stale(self.build_envs, self.max_age)
+        _evict_stale(self.artifacts, self.max_age)
+
+    def get_source_hash(self, package: PyPackage, build_system: BuildSystem) -> str:
+        """Get a hash of the source files of the package and its build system.
+
+        The source files are the ones not ignored by git, except the venv and
+        the outputs of previous builds.
+        """
+        hasher = hashlib.sha256()
+        hasher.update(f"env:{get_build_env_key(build_system.requires)}\n".encode())
+        hasher.update(f"backend:{build_system.backend}\n".encode())
+        for path in build_system.backend_path:
+            hasher.update(f"backend-path:{path}\n".encode())
+        repo = self.config.get_repo()
+        root = Path(repo.repo.working_dir)
+        for filename in repo.list_files(package.path):
+            path = root / filename
+            if _is_build_output(path.relative_to(package.path).parts):
+                continue
+            try:
+                content = path.read_bytes()
+            except OSError:
+                # Deleted but still tracked
+                continue
+            hasher.update(f"file:{filename}:{len(content)}\n".encode())
+            hasher.update(content)
+        return hasher.hexdigest()
+
+    async def _provision(self, requires: Iterable[str]) -> Path:
+        """Get the build environment with the requirements installed.
+
+        The builds wait for the environment to be provisioned before using it.
+        """
+        requirements = _normalize_requires(requires)
+        env_path = self.get_build_env(requirements)
+        async with self._env_locks.setdefault(env_path, asyncio.Lock()):
+            if env_path not in self._provisioned:
+                # The stamp is only missing if provisioning was interrupted
+                stamp = get_install_stamp(requirements, [])
+                if read_install_stamp(env_path) != stamp:
+                    if requirements:
+                        await pip_install(env_path, requirements)
+                    else:
+                        await run_sync(ensure_virtualenv, env_path)
+                    write_install_stamp(env_path, stamp)
+                env_path.joinpath(LAST_USED_FILE).touch()
+                self._provisioned.add(env_path)
+        return env_path
+
+    def _call_hook(
+        self,
+        python: Path,
+        build_system: BuildSystem,
+        job: Job | None,
+        hook: str,
+        cwd: Path,
+        **kwargs: Any,
+    ) -> Any:
+        with self.pool.acquire(python, build_system, cwd) as worker:
+            return worker.call(hook, cwd, job, **kwargs)
+
+    async def _build_target(
+        self, package: PyPackage, build_system: BuildSystem, target: str, outdir: Path
+    ) -> str:
+        env_path = await self._provision(build_system.requires)
+        python = get_venv_python(env_path)
+        job = current_job.get()
+        requires = await run_sync(
+            self._call_hook,
+            python,
+            build_system,
+            job,
+            f"get_requires_for_build_{target}",
+            package.path,
+            config_settings=None,
+        )
+        if requires:
+            # Build in the environment with the dynamic requirements as well,
+            # instead of installing them into the shared one
+            env_path = await self._provision([*build_system.requires, *requires])
+            python = get_venv_python(env_path)
+        return await run_sync(
+            self._call_hook,
+            python,
+            build_system,
+            job,
+            f"build_{target}",
+            package.path,
+            config_settings=None,
+            **{f"{target}_directory": str(outdir)},
+        )
+
+    async def build(
+        self, package: PyPackage, outdir: Path, sdist: bool = False
+    ) -> BuildResult:
+        """Build the wheel, and the sdist if requested, of the package into outdir,
+        or copy them from the cache if the package is unchanged.
+        """
+        build_system = get_build_system(package.path)
+        try:
+            return await self._build(package, build_system, outdir, sdist)
+        finally:
+            await run_sync(self.pool.retire, package.path)
+
+    async def _build(
+        self, package: PyPackage, build_system: BuildSystem, outdir: Path, sdist: bool
+    ) -> BuildResult:
+        source_hash = await run_sync(self.get_source_hash, package, build_system)
+        artifacts: list[Path] = []
+        cached = True
+        for target in ["wheel", "sdist"] if sdist else ["wheel"]:
+            cache_dir = self.artifacts / f"{source_hash}-{target}"
+            if not cache_dir.is_dir():
+                cached = False
+                self.artifacts.mkdir(parents=True, exist_ok=True)
+                temp_dir = Path(tempfile.mkdtemp(dir=self.artifacts, prefix=".tmp-"))
+                try:
+                    await self._build_target(package, build_system, target, temp_dir)
+                    try:
+                        os.replace(temp_dir, cache_dir)
+                    except OSError:
+                        # Another process has cached it meanwhile
+                        if not cache_dir.is_dir():
+                            raise
+                finally:
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+            cache_dir.joinpath(LAST_USED_FILE).touch()
+            for artifact in cache_dir.iterdir():
+                if artifact.name != LAST_USED_FILE:
+                    artifacts.append(Path(shutil.copy2(artifact, outdir)))
+        return BuildResult(artifacts, cached)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Iterable
+
+from monas.project import PyPackage
+from monas.vcs import DescribeResult, Git
+
+CACHE_VERSION = 1
+
+
+class ChangesCache:
+    """The last release and the packages changed since, of the last repository
+    state they were computed for.
+
+    It is stored at `.monas/changes.json` under the monorepo root. The state is
+    identified by the HEAD commit, the tags, the uncommitted changes of the
+    tracked files and the package paths. Like the package index, a state with
+    changed files modified no earlier than the cache was written is considered
+    racy and never read from the cache.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.path = root / ".monas" / "changes.json"
+
+    def get_key(
+        self, repo: Git, packages: Iterable[PyPackage]
+    ) -> tuple[str, int] | None:
+        """Get the key of the current repository state.
+
+        Returns:
+            The key and the latest mtime of the changed files, or None if the
+            refs can't be read directly
+        """
+        head = repo.read_ref("HEAD")
+        tags = repo.get_tags_fingerprint()
+        if head is None or tags is None:
+            return None
+        worktree, latest_mtime = repo.get_worktree_state()
+        hasher = hashlib.sha256()
+        hasher.update(f"head:{head}\ntags:{tags}\nworktree:{worktree}\n".encode())
+        for path in sorted(
+            pkg.path.relative_to(self.root).as_posix() for pkg in packages
+        ):
+            hasher.update(f"package:{path}\n".encode())
+        return hasher.hexdigest(), latest_mtime
+
+    def get(
+        self, key: str, latest_mtime: int
+    ) -> tuple[DescribeResult, list[str]] | None:
+        """Get the release and the names of the changed packages for the key.
+
+        Args:
+            key: The key of the current repository state
+            latest_mtime: The latest mtime of the changed files
+        """
+        try:
+            with self.path.open(encoding="utf-8") as f:
+                data = json.load(f)
+            if latest_mtime >= os.stat(self.path).st_mtime_ns:
+                return None
+        except (OSError, ValueError):
+            return None
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != CACHE_VERSION
+            or data.get("key") != key
+        ):
+            return None
+        return DescribeResult(*data["describe"]), data["packages"]
+
+    def set(
+        self, key: str, describe_result: DescribeResult, packages: Iterable[PyPackage]
+    ) -> None:
+        """Store the release and the changed packages for the key"""
+        data = {
+            "version": CACHE_VERSION,
+            "key": key,
+            "describe": list(describe_result),
+            "packages": [pkg.name for pkg in packages],
+        }
+        try:
+            self.path.parent.mkdir(exist_ok=True)
+            with NamedTemporaryFile(
+                "w", dir=self.path.parent, suffix=".tmp", delete=False
+            ) as f:
+                json.dump(data, f)
+            os.replace(f.name, self.path)
+        except OSError:
+            # The cache is only an optimization, never fail the command
+            pass
@@ -8,9 +8,11 @@ from rich import traceback
 from monas.commands.add import add
 from monas.commands.bump import bump
 from monas.commands.changed import changed
+from monas.commands.check import check
 from monas.commands.init import init
 from monas.commands.install import install
 from monas.commands.list import list_command
+from monas.commands.lock import lock
 from monas.commands.new import new
 from monas.commands.publish import publish
 from monas.commands.remove import remove
@@ -44,10 +46,12 @@ def main():
 main.add_command(add)
 main.add_command(bump)
 main.add_command(changed)
+main.add_command(check)
 main.add_command(init)
 main.add_command(install)
 main.add_command(list_command)
 main.add_alias("ls", "list")
+main.add_command(lock)
 main.add_command(new)
 main.add_command(publish)
 main.add_command(remove)
@@ -7,7 +7,7 @@ from parver import Version
 from questionary.prompts.common import Choice
 from rich.prompt import Confirm
 
-from monas.commands.common import get_changed_packages
+from monas.commands.common import get_release_changes
 from monas.config import Config, pass_config
 from monas.utils import console, info
 
@@ -84,8 +84,7 @@ def bump(
     monas major alpha: [green]1.0.0alpha0[/]
     """
     repo = config.get_repo()
-    describe_result = repo.describe_ref()
-    packages = get_changed_packages(config, describe_result)
+    _, packages = get_release_changes(config)
 
     if not packages:
         info("Current HEAD is already released, nothing to do")
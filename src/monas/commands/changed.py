@@ -2,18 +2,58 @@ from __future__ import annotations
 
 import rich_click as click
 
-from monas.commands.common import get_changed_packages, list_packages, output_options
+from monas.commands.common import (
+    concurrency_option,
+    get_packages_changed_since,
+    get_release_changes,
+    list_packages,
+    output_options,
+)
 from monas.config import Config, pass_config
 from monas.utils import info
 
 
 @click.command()
 @output_options
+@concurrency_option
+@click.option(
+    "--since",
+    metavar="REF",
+    help="List packages changed between the given ref and HEAD, "
+    "instead of since last tagged release",
+)
+@click.option(
+    "--merge-base",
+    is_flag=True,
+    default=False,
+    help="Compare with the merge base of the ref and HEAD, "
+    "to only include the changes made on the current branch",
+)
 @pass_config
-def changed(config: Config, *, long: bool, json: bool):
+def changed(
+    config: Config,
+    *,
+    long: bool,
+    json: bool,
+    concurrency: int,
+    since: str | None = None,
+    merge_base: bool = False,
+):
     """List packages changed since last tagged release."""
-    describe_result = config.get_repo().describe_ref()
-    packages = get_changed_packages(config, describe_result)
+    if since is not None:
+        packages = get_packages_changed_since(config, since, merge_base)
+        if not packages:
+            info(f"No change since [succ]{since}[/]")
+            return
+        info(
+            f"Found [primary]{len(packages)}[/] package(s) changed since "
+            f"[succ]{since}[/]"
+        )
+        list_packages(packages, long=long, json=json)
+        return
+    if merge_base:
+        raise click.UsageError("--merge-base can only be used with --since")
+    describe_result, packages = get_release_changes(config)
     if not packages:
         info(f"No change since last tag [succ]{describe_result.tag}[/]")
         return
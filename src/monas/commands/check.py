@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from typing import Any
+
+import rich_click as click
+
+from monas.commands.common import check_conflicts, filter_options, filter_packages
+from monas.config import Config, pass_config
+from monas.utils import info
+
+
+@click.command()
+@click.option(
+    "--conflicts",
+    is_flag=True,
+    default=False,
+    help="Check for incompatible requirements on the same external dependency",
+)
+@click.option(
+    "--python",
+    "python_versions",
+    metavar="VERSION",
+    multiple=True,
+    help="[cyan](multiple)[/]Evaluate the markers with the given Python version, "
+    "default to the Python version of the monorepo",
+)
+@click.option(
+    "--root",
+    is_flag=True,
+    default=False,
+    help="Check the packages as if they are installed into the same environment",
+)
+@filter_options
+@pass_config
+def check(
+    config: Config,
+    *,
+    conflicts: bool,
+    python_versions: tuple[str, ...],
+    root: bool,
+    **kwargs: Any,
+) -> None:
+    """Check the packages for problems without installing them.
+    All checks are run if none is selected.
+    """
+    packages = list(filter_packages(config, **kwargs))
+    if not packages:
+        info("[notice]No package is found[/]")
+        return
+    run_all = not conflicts
+    if conflicts or run_all:
+        groups = [packages] if root else [[pkg] for pkg in packages]
+        check_conflicts(config, groups, python_versions)
+    info("[succ]No problem is found[/]")
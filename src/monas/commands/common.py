@@ -2,14 +2,18 @@ from __future__ import annotations
 
 import multiprocessing
 from fnmatch import fnmatch
+from pathlib import Path
 from typing import Collection, Iterable
 
 import click
+from git.exc import GitCommandError
 from rich.table import Table
 
+from monas.changes import ChangesCache
 from monas.config import Config
 from monas.project import PyPackage
-from monas.utils import console, is_relative_to
+from monas.requirements import Conflict, find_conflicts
+from monas.utils import PathTrie, console, err_console
 from monas.vcs import DescribeResult
 
 
@@ -39,12 +43,18 @@ def output_options(f):
     )
 
 
+def _set_concurrency(ctx: click.Context, param: click.Parameter, value: int) -> int:
+    ctx.ensure_object(Config).concurrency = value
+    return value
+
+
 concurrency_option = click.option(
     "--concurrency",
     "-c",
     default=multiprocessing.cpu_count(),
     type=int,
     help="The number of concurrent processes to use",
+    callback=_set_concurrency,
 )
 
 
@@ -52,7 +62,7 @@ def filter_packages(
     config: Config, *, include: Collection[str], exclude: Collection[str]
 ) -> Iterable[PyPackage]:
     """Filter the packages with the include and exclude pattern."""
-    for package in config.iter_packages():
+    for package in config.get_graph().packages.values():
         name = package.path.name
         if (include or any(fnmatch(name, pattern) for pattern in exclude)) and not any(
             fnmatch(name, pattern) for pattern in include
@@ -92,12 +102,107 @@ def get_changed_packages(
     repo = config.get_repo()
     if describe_result.tag and describe_result.distance == 0:
         return []
-    packages = list(config.iter_packages())
+    packages = list(config.get_graph().packages.values())
     if describe_result.tag:
-        diff_files = repo.diff(describe_result.tag)
-        packages = [
-            pkg
-            for pkg in packages
-            if any(is_relative_to(config.path / f, pkg.path) for f in diff_files)
-        ]
+        trie: PathTrie[PyPackage] = PathTrie()
+        for pkg in packages:
+            trie.insert(pkg.path.absolute(), pkg)
+        # The changed files are relative to the repository root
+        root = Path(repo.repo.working_dir).absolute()
+        changed: set[str] = set()
+        for f in repo.diff(describe_result.tag):
+            changed.update(pkg.name for pkg in trie.find(root / f))
+            if len(changed) == len(packages):
+                # No need to read the rest of the diff
+                break
+        packages = [pkg for pkg in packages if pkg.name in changed]
     return packages
+
+
+def get_release_changes(config: Config) -> tuple[DescribeResult, list[PyPackage]]:
+    """Get the last release and the packages changed since.
+
+    The result is reused from the last call if the repository is unchanged.
+    """
+    repo = config.get_repo()
+    packages = list(config.get_graph().packages.values())
+    cache = ChangesCache(config.path)
+    key = cache.get_key(repo, packages)
+    if key is not None:
+        cached = cache.get(*key)
+        if cached is not None:
+            describe_result, names = cached
+            by_name = {pkg.name: pkg for pkg in packages}
+            if all(name in by_name for name in names):
+                return describe_result, [by_name[name] for name in names]
+    describe_result = repo.describe_ref()
+    changed = get_changed_packages(config, describe_result)
+    if key is not None:
+        cache.set(key[0], describe_result, changed)
+    return describe_result, changed
+
+
+def get_packages_changed_since(
+    config: Config, ref: str, merge_base: bool = False
+) -> list[PyPackage]:
+    """Get the packages changed between the ref and HEAD, by comparing the ids
+    of the git trees of the package directories in the two commits.
+
+    Args:
+        config: The monas configuration
+        ref: The ref to compare with
+        merge_base: Whether to compare with the merge base of the ref and HEAD
+    """
+    repo = config.get_repo()
+    try:
+        base = repo.resolve_commit(ref)
+        head = repo.resolve_commit("HEAD")
+    except ValueError as e:
+        raise click.UsageError(f"Unknown ref {ref}") from e
+    if merge_base:
+        try:
+            base = repo.merge_base(base, head)
+        except GitCommandError as e:
+            raise click.UsageError(f"No merge base of {ref} and HEAD") from e
+    packages = list(config.get_graph().packages.values())
+    # The paths in the trees are relative to the repository root
+    paths = [repo.get_relative_path(pkg.path) for pkg in packages]
+    old_ids = repo.get_tree_ids(base, paths)
+    new_ids = repo.get_tree_ids(head, paths)
+    return [
+        pkg
+        for pkg, old, new in zip(packages, old_ids, new_ids)
+        if new is None or old != new
+    ]
+
+
+def check_conflicts(
+    config: Config,
+    groups: Iterable[Iterable[PyPackage]],
+    python_versions: Collection[str] = (),
+) -> None:
+    """Report the conflicting requirements of the packages and exit if any.
+
+    Args:
+        config: The monas configuration
+        groups: Each group is a list of packages to be installed together
+        python_versions: The Python versions to evaluate the markers with,
+            default to the Python version of the monorepo
+    """
+    conflicts = find_conflicts(
+        config.get_graph(), groups, python_versions or [config.python_version]
+    )
+    if conflicts:
+        print_conflicts(conflicts)
+        raise click.ClickException(f"Found {len(conflicts)} conflict(s)")
+
+
+def print_conflicts(conflicts: Iterable[Conflict]) -> None:
+    """Print the conflicting requirements."""
+    for conflict in conflicts:
+        err_console.print(
+            f" [danger]CONFLICT[/] {conflict.name} "
+            f"[info](python {conflict.python_version})[/]"
+        )
+        for pkg, req in conflict.requirements:
+            err_console.print(f"   {pkg.name} requires [primary]{req}[/]")
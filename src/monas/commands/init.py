@@ -96,6 +96,14 @@ def init(
             *.egg-info/
             .envrc
             .direnv/
+            .monas/
             """
             )
         )
+    else:
+        # The caches of monas are kept out of an existing repository as well
+        content = gitignore.read_text()
+        if ".monas/" not in content.splitlines():
+            if content and not content.endswith("\n"):
+                content += "\n"
+            gitignore.write_text(f"{content}.monas/\n")
@@ -1,17 +1,92 @@
 from __future__ import annotations
 
-from concurrent.futures import Future
-from concurrent.futures import ThreadPoolExecutor as Pool
+import functools
+from pathlib import Path
 from shlex import join as sh_join
-from typing import Any
+from typing import Any, Awaitable, Callable
 
 import rich_click as click
 
-from monas.commands.common import concurrency_option, filter_options, filter_packages
+from monas.commands.common import (
+    check_conflicts,
+    concurrency_option,
+    filter_options,
+    filter_packages,
+)
 from monas.config import Config, pass_config
+from monas.lock import LOCK_FILENAME, LockError, Lockfile
 from monas.project import PyPackage
+from monas.requirements import (
+    get_build_requirements,
+    get_external_requirements,
+    get_workspace_constraints,
+)
+from monas.utils import (
+    Job,
+    build_wheelhouse,
+    info,
+    pip_install,
+    print_job_failure,
+    run_job,
+    show_jobs,
+)
 from monas.utils import err_console as console
-from monas.utils import info, pip_install
+
+
+def get_install_jobs(
+    config: Config,
+    packages: list[PyPackage],
+    installer: Callable[[PyPackage], Awaitable[bool]] = PyPackage.install,
+) -> list[Job]:
+    """Get the jobs to install the packages in waves following the dependency order.
+
+    A package is only started when all local dependencies among the given packages
+    have finished, and packages with the longest chains of dependents go first.
+    Packages depending on a failed one are not installed.
+    """
+    graph = config.get_graph()
+    selected = {pkg.canonical_name: pkg for pkg in packages}
+    priorities = graph.get_critical_path_lengths(selected)
+    jobs: dict[str, Job] = {}
+    for name, pkg in selected.items():
+        jobs[name] = Job(
+            pkg.name,
+            functools.partial(installer, pkg),
+            priority=priorities[name],
+        )
+    for name, job in jobs.items():
+        job.requires = [
+            jobs[dep.canonical_name]
+            for dep in graph.get_local_dependencies(name)
+            if dep.canonical_name in jobs
+        ]
+    return list(jobs.values())
+
+
+def load_frozen_lock(config: Config) -> Lockfile:
+    """Load the lock file of the monorepo, which must be up to date"""
+    lock_path = config.path / LOCK_FILENAME
+    if not lock_path.exists():
+        raise click.UsageError(f"{LOCK_FILENAME} is not found, run `monas lock` first")
+    try:
+        lock = Lockfile.load(lock_path)
+    except LockError as e:
+        raise click.UsageError(str(e)) from e
+    graph = config.get_graph()
+    if lock.requirements != get_external_requirements(graph, graph.packages.values()):
+        raise click.UsageError(
+            f"{LOCK_FILENAME} is outdated, run `monas lock` to update it"
+        )
+    return lock
+
+
+def write_constraints(config: Config) -> str:
+    """Write the workspace constraints file and return the pip option line"""
+    path = config.path / ".monas" / "constraints.txt"
+    path.parent.mkdir(exist_ok=True)
+    lines = get_workspace_constraints(config.get_graph())
+    path.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+    return sh_join(["-c", path.as_posix()])
 
 
 @click.command()
@@ -22,9 +97,62 @@ from monas.utils import info, pip_install
     default=False,
     help="Install all packages into the root project",
 )
+@click.option(
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Reinstall even if the package venv is up to date",
+)
+@click.option(
+    "--wheelhouse",
+    metavar="DIR",
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Collect wheels of external dependencies into DIR once, "
+    "and install all packages from it without accessing the index",
+)
+@click.option(
+    "--link",
+    is_flag=True,
+    default=False,
+    help="Link local packages with .pth files instead of installing them "
+    "in editable mode with pip. Entry points of local packages are not installed",
+)
+@click.option(
+    "--constraints",
+    is_flag=True,
+    default=False,
+    help="Constrain the external dependencies of every package with the merged "
+    "specifiers of all packages, to keep their versions aligned",
+)
+@click.option(
+    "--frozen",
+    is_flag=True,
+    default=False,
+    help=f"Install the external dependencies pinned in {LOCK_FILENAME} "
+    "without resolving them",
+)
+@click.option(
+    "--no-check",
+    "check",
+    flag_value=False,
+    default=True,
+    help="Don't check for conflicting requirements before installing",
+)
 @filter_options
 @pass_config
-def install(config: Config, *, concurrency: int, root: bool, **kwargs: Any) -> None:
+def install(
+    config: Config,
+    *,
+    concurrency: int,
+    root: bool,
+    force: bool,
+    link: bool = False,
+    wheelhouse: Path | None = None,
+    frozen: bool = False,
+    constraints: bool = False,
+    check: bool = True,
+    **kwargs: Any,
+) -> None:
     """Link the packages and install the remaining dependencies."""
     packages = list(filter_packages(config, **kwargs))
     package_count = len(packages)
@@ -33,29 +161,98 @@ def install(config: Config, *, concurrency: int, root: bool, **kwargs: Any) -> N
         info("[notice]No package is found[/]")
         return
 
+    lock = load_frozen_lock(config) if frozen else None
+    if lock is None and check:
+        if root:
+            check_conflicts(config, [packages])
+        elif constraints:
+            check_conflicts(config, [config.get_graph().packages.values()])
+        else:
+            check_conflicts(config, [[pkg] for pkg in packages])
+
+    options: list[str] = []
+    if wheelhouse is not None:
+        wheelhouse = wheelhouse.absolute()
+        graph = config.get_graph()
+        requirements = get_external_requirements(graph, packages)
+        local_packages = {
+            pkg.canonical_name: pkg
+            for package in packages
+            for pkg in [*graph.get_local_dependencies(package.canonical_name), package]
+        }
+        requirements += get_build_requirements(local_packages.values())
+        with console.status(
+            f"Collecting wheels into [primary]{wheelhouse}[/]", spinner="point"
+        ):
+            build_wheelhouse(wheelhouse, requirements, config.get_python())
+        options = ["--no-index", sh_join(["--find-links", wheelhouse.as_posix()])]
+
+    if constraints and lock is None:
+        options.append(write_constraints(config))
+
     if root:
         with console.status(
             f"Installing [primary]{package_count}[/] package(s) to the root project",
             spinner="point",
         ):
-            requirements = (sh_join(["-e", pkg.path.as_posix()]) for pkg in packages)
-            pip_install(config.root_venv, requirements)
+            requirements = [
+                *options,
+                *(sh_join(["-e", pkg.path.as_posix()]) for pkg in packages),
+            ]
+
+            locked: list[str] = []
+            if lock is not None:
+                try:
+                    locked = lock.get_requirements(
+                        get_external_requirements(config.get_graph(), packages)
+                    )
+                except LockError as e:
+                    raise click.UsageError(str(e)) from e
+
+            async def install_root() -> None:
+                python_version = config.python_version
+                if lock is None:
+                    await pip_install(
+                        config.root_venv, requirements, python_version=python_version
+                    )
+                    return
+                if locked:
+                    await pip_install(
+                        config.root_venv,
+                        [*options, *locked],
+                        no_deps=True,
+                        python_version=python_version,
+                    )
+                await pip_install(
+                    config.root_venv,
+                    requirements,
+                    no_deps=True,
+                    python_version=python_version,
+                )
+
+            run_job(Job("root", install_root))
         info("[succ]Installation done[/]")
         return
     errors: list[BaseException] = []
 
-    def _on_complete(project: PyPackage, future: Future) -> None:
-        if future.exception():
-            console.print(f" [red bold]FAIL[/] {project.name} {future.exception()}")
-            errors.append(future.exception())
+    def _on_complete(job: Job) -> None:
+        if job.exception is not None:
+            print_job_failure(job)
+            errors.append(job.exception)
+        elif job.result is False:
+            console.print(f" [info]SKIP[/] {job.name} is up to date")
         else:
-            console.print(f" [succ]SUCC[/] {project.name}")
-
-    with console.status(
-        f"Installing [primary]{package_count}[/] package(s)", spinner="point"
-    ):
-        with Pool(concurrency) as executor:
-            for pkg in packages:
-                future = executor.submit(pkg.install)
-                future.add_done_callback(lambda f, pkg=pkg: _on_complete(pkg, f))
+            console.print(f" [succ]SUCC[/] {job.name} [info]({job.elapsed:.1f}s)[/]")
+
+    installer = functools.partial(
+        PyPackage.install, force=force, options=options, link=link, lock=lock
+    )
+    jobs = get_install_jobs(config, packages, installer)
+    show_jobs(
+        jobs,
+        concurrency,
+        f"Installing [primary]{package_count}[/] package(s)",
+        _on_complete,
+        config.log_dir / "install",
+    )
     info("[danger]Some packages failed[/]" if errors else "[succ]All succeeded[/]")
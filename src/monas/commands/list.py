@@ -3,6 +3,7 @@ from typing import Any
 import rich_click as click
 
 from monas.commands.common import (
+    concurrency_option,
     filter_options,
     filter_packages,
     list_packages,
@@ -14,9 +15,12 @@ from monas.utils import info
 
 @click.command("list")
 @output_options
+@concurrency_option
 @filter_options
 @pass_config
-def list_command(config: Config, *, long: bool, json: bool, **kwargs: Any):
+def list_command(
+    config: Config, *, long: bool, json: bool, concurrency: int, **kwargs: Any
+):
     """List packages managed by Monas. [yellow]alias: ls[/]"""
     packages = list(filter_packages(config, **kwargs))
     info(f"Found [primary]{len(packages)}[/] package(s)")
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import rich_click as click
+
+from monas.config import Config, pass_config
+from monas.lock import LOCK_FILENAME, Lockfile, resolve_requirements
+from monas.requirements import get_external_requirements
+from monas.utils import err_console as console
+from monas.utils import info
+
+
+@click.command()
+@pass_config
+def lock(config: Config) -> None:
+    """Resolve the external dependencies of all packages into a lock file."""
+    graph = config.get_graph()
+    requirements = get_external_requirements(graph, graph.packages.values())
+    with console.status(
+        f"Resolving [primary]{len(requirements)}[/] requirement(s) "
+        f"for Python [succ]{config.python_version}[/]",
+        spinner="point",
+    ):
+        report = (
+            resolve_requirements(requirements, config.get_python())
+            if requirements
+            else {}
+        )
+    lockfile = Lockfile.from_report(requirements, {"install": [], **report})
+    lockfile.write(config.path / LOCK_FILENAME)
+    info(
+        f"Locked [primary]{len(lockfile.packages)}[/] package(s) "
+        f"into [succ]{LOCK_FILENAME}[/]"
+    )
@@ -1,35 +1,30 @@
 from __future__ import annotations
 
 import functools
-import os
 import shutil
-import sys
-from asyncio import subprocess
-from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import rich_click as click
 from click.decorators import pass_context
 from rich.prompt import Confirm
+from twine.exceptions import TwineException
+from twine.settings import Settings
 
+from monas.builder import Builder
 from monas.commands.common import concurrency_option
 from monas.config import Config, pass_config
-from monas.project import PyPackage
-from monas.utils import console, err_console, info, pip_install, run_command
+from monas.uploader import (
+    SIMPLE_INDEXES,
+    Uploader,
+    UploadState,
+    get_published_packages,
+)
+from monas.utils import Job, console, err_console, info, print_job_failure, show_jobs
 
 
-def build_package(package: PyPackage, dist: Path, sdist: bool = False) -> str:
-    # Install build tool
-    venv_path = package.path / ".venv"
-    pip_install(venv_path, ["build"])
-    if os.name == "nt":
-        python = venv_path / "Scripts" / "python.exe"
-    else:
-        python = venv_path / "bin" / "python"
-    build_args = [str(python), "-m", "build", "--outdir", str(dist), "--wheel"]
-    if sdist:
-        build_args.append("--sdist")
-    run_command(build_args, cwd=str(package.path), stdout=subprocess.DEVNULL)
+async def upload_artifacts(uploader: Uploader, build_job: Job) -> list[Path]:
+    """Upload the artifacts built by the job"""
+    return await uploader.upload(build_job.result.artifacts)
 
 
 @click.command()
@@ -40,6 +35,20 @@ def build_package(package: PyPackage, dist: Path, sdist: bool = False) -> str:
 @click.option("--username", "-u", help="PyPI username")
 @click.option("--password", "-p", help="PyPI password or token")
 @click.option("--repository", "-r", help="Repository name or URL")
+@click.option(
+    "--upload-concurrency",
+    default=4,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="The number of concurrent uploads",
+)
+@click.option(
+    "--index-url",
+    metavar="URL",
+    help="The simple index to look for the versions already published, which "
+    "are neither built nor uploaded. It can be a local directory. "
+    "Default to the index of PyPI or TestPyPI when publishing to them",
+)
 @pass_config
 @pass_context
 def publish(
@@ -51,6 +60,8 @@ def publish(
     username: str | None = None,
     password: str | None = None,
     repository: str | None = None,
+    upload_concurrency: int = 4,
+    index_url: str | None = None,
 ):
     """Publish packages in this release to PyPI."""
     packages_to_publish = [
@@ -59,15 +70,40 @@ def publish(
     if not packages_to_publish:
         info("No package to publish")
         return
+    is_url = repository is not None and repository.startswith(("http://", "https://"))
     if repository is None:
-        repo_args = []
         index = "[link]https://pypi.org/simple[/]"
-    elif repository.startswith(("http://", "https://")):
-        repo_args = ["--repository-url", repository]
+    elif is_url:
         index = f"[link]{repository}[/]"
     else:
-        repo_args = ["--repository", repository]
         index = f"[succ]{repository}[/]"
+    try:
+        settings = Settings(
+            username=username,
+            password=password,
+            non_interactive=True,
+            disable_progress_bar=True,
+            repository_name="pypi" if repository is None or is_url else repository,
+            repository_url=repository if is_url else None,
+        )
+        settings.check_repository_url()
+    except TwineException as e:
+        raise click.UsageError(str(e)) from e
+    if index_url is None and not is_url:
+        index_url = SIMPLE_INDEXES.get(repository or "pypi")
+    if index_url is not None:
+        with err_console.status("Checking the published versions", spinner="point"):
+            published = get_published_packages(
+                index_url, packages_to_publish, upload_concurrency
+            )
+        for pkg in published:
+            err_console.print(
+                f" [info]SKIP[/] {pkg.name} {pkg.version} already exists on the index"
+            )
+        packages_to_publish = [p for p in packages_to_publish if p not in published]
+        if not packages_to_publish:
+            info("No package to publish")
+            return
     info(f"The following packages are to be built and published to {index}:")
     for pkg in packages_to_publish:
         console.print(f"  [primary]{pkg.name}[/] [succ]{pkg.version}[/]")
@@ -77,28 +113,50 @@ def publish(
     if dist.exists():
         shutil.rmtree(dist)
     dist.mkdir()
-    with err_console.status(
-        f"Building [primary]{len(packages_to_publish)}[/] package(s)", spinner="point"
-    ):
-        builder = functools.partial(build_package, dist=dist, sdist=sdist)
-        with ThreadPoolExecutor(concurrency) as pool:
-            pool.map(builder, packages_to_publish)
-    twine_args = [
-        sys.executable,
-        "-m",
-        "twine",
-        "upload",
-        "--non-interactive",
-        "dist/*",
-    ]
-    if username is not None:
-        twine_args.extend(["--username", username])
-    if password is not None:
-        twine_args.extend(["--password", password])
-    twine_args.extend(repo_args)
-    with err_console.status(
-        f"Publishing [primary]{len(packages_to_publish)}[/] package(s) to {index}",
-        spinner="point",
-    ):
-        run_command(twine_args, cwd=str(config.path))
+    failed = False
+
+    def _on_complete(job: Job) -> None:
+        nonlocal failed
+        if job.exception is not None:
+            print_job_failure(job)
+            failed = True
+        elif job.pool == "upload":
+            for path in job.result:
+                err_console.print(f" [succ]UPLOADED[/] {path.name}")
+        elif job.result.cached:
+            err_console.print(
+                f" [info]SKIP[/] {job.name} is unchanged, reuse the cache"
+            )
+        else:
+            err_console.print(
+                f" [succ]SUCC[/] {job.name} [info]({job.elapsed:.1f}s)[/]"
+            )
+
+    state = UploadState(config.path)
+    with Builder(config, concurrency) as builder, Uploader(
+        settings, state, upload_concurrency
+    ) as uploader:
+        jobs: list[Job] = []
+        for pkg in packages_to_publish:
+            build_job = Job(
+                pkg.name, functools.partial(builder.build, pkg, dist, sdist=sdist)
+            )
+            upload_job = Job(
+                f"upload-{pkg.name}",
+                functools.partial(upload_artifacts, uploader, build_job),
+                requires=[build_job],
+                pool="upload",
+            )
+            jobs.extend([build_job, upload_job])
+        show_jobs(
+            jobs,
+            concurrency + upload_concurrency,
+            f"Publishing [primary]{len(packages_to_publish)}[/] package(s) to {index}",
+            _on_complete,
+            config.log_dir / "publish",
+            limits={"": concurrency, "upload": upload_concurrency},
+        )
+    if failed:
+        info("[danger]Some packages failed to publish[/]")
+        ctx.exit(1)
     info("[succ]Publish done[/]")
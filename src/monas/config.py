@@ -1,20 +1,36 @@
 from __future__ import annotations
 
+import multiprocessing
+import os
 import sys
 import typing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
 import click
 from tomlkit.toml_file import TOMLFile
 
+from monas.index import Fingerprint, PackageIndex, get_fingerprint
+from monas.utils import (
+    ensure_virtualenv_template,
+    find_python,
+    get_venv_python,
+    read_toml,
+)
 from monas.vcs import Git
 
 if typing.TYPE_CHECKING:
-    from tomlkit.toml_document import TOMLDocument
+    from tomlkit.items import Table
 
+    from monas.graph import WorkspaceGraph
     from monas.project import PyPackage
 
+# Use worker processes to read package metadata when there are at least
+# this many packages not found in the index
+PARALLEL_THRESHOLD = 64
+
 
 class Config:
     """The configuration for monas tool.
@@ -22,11 +38,15 @@ class Config:
     It is stored as [tool.monas] table in the `pyproject.toml` file.
     """
 
-    _pyproject: TOMLDocument
+    _pyproject: dict
     _tool: dict
 
     def __init__(self) -> None:
         self.path = self._locate_mono_project()
+        self.index = PackageIndex(self.path)
+        self._graph: WorkspaceGraph | None = None
+        self._repo: Git | None = None
+        self.concurrency = multiprocessing.cpu_count()
 
     def _locate_mono_project(self) -> Path:
         """Find the pyproject.toml with monas setting in the current or parent dirs"""
@@ -34,22 +54,43 @@ class Config:
         for parent in [path, *path.parents]:
             if not (parent / "pyproject.toml").exists():
                 continue
-            self._pyproject = TOMLFile(parent / "pyproject.toml").read()
-            self._tool = self._pyproject.setdefault("tool", {}).setdefault("monas", {})
+            self._pyproject = read_toml(parent / "pyproject.toml")
+            self._tool = self._pyproject.get("tool", {}).get("monas", {})
             if self._tool:
                 return parent
         raise click.UsageError(
             "Monas repo isn't initialized, have you run `monas init`?"
         )
 
+    @contextmanager
+    def _edit_tool(self) -> Iterator[Table]:
+        """Edit the [tool.monas] table in place and write it back.
+
+        The style-preserving tomlkit document is only loaded here, read-only
+        access goes through the parsed data.
+        """
+        pyproject_toml = TOMLFile(self.path / "pyproject.toml")
+        document = pyproject_toml.read()
+        yield document.setdefault("tool", {}).setdefault("monas", {})
+        pyproject_toml.write(document)
+        self._pyproject = read_toml(self.path / "pyproject.toml")
+        self._tool = self._pyproject["tool"]["monas"]
+
     def get_repo(self) -> Git:
         """Get the git repository."""
-        return Git(self.path)
+        if self._repo is None:
+            self._repo = Git(self.path)
+        return self._repo
 
     @property
     def root_venv(self) -> Path:
         return self.path / ".venv"
 
+    @property
+    def log_dir(self) -> Path:
+        """The directory to store the output logs of jobs"""
+        return self.path / ".monas" / "logs"
+
     @property
     def homepage(self) -> str | None:
         """Get the homepage."""
@@ -68,8 +109,8 @@ class Config:
 
     def set_version(self, version: str) -> None:
         """Set the version of the monorepo"""
-        self._tool["version"] = version
-        TOMLFile(self.path / "pyproject.toml").write(self._pyproject)
+        with self._edit_tool() as tool:
+            tool["version"] = version
 
     @property
     def python_version(self) -> str:
@@ -78,6 +119,31 @@ class Config:
             "python-version", ".".join(map(str, sys.version_info[:2]))
         )
 
+    @property
+    def clone_venvs(self) -> bool:
+        """Whether to create package venvs by cloning a template venv.
+
+        It is only supported on POSIX systems.
+        """
+        return os.name != "nt" and bool(self._tool.get("clone-venvs", False))
+
+    def get_venv_template(self) -> Path:
+        """Get the path of the template venv for the selected Python version"""
+        return self.path / ".monas" / "venv-templates" / self.python_version
+
+    def get_python(self) -> Path:
+        """Get the interpreter of the selected Python version, the same one
+        the package venvs are created with.
+
+        With clone-venvs, it is the one of the template venv, created if missing.
+        """
+        if not self.clone_venvs:
+            return find_python(self.python_version)
+        template = ensure_virtualenv_template(
+            self.get_venv_template(), self.python_version
+        )
+        return get_venv_python(template)
+
     @property
     def default_package_dir(self) -> Path:
         """
@@ -98,8 +164,8 @@ class Config:
             relative_path = relative_path / "*"
         if (self.path / relative_path) in self.package_paths:
             return
-        self._tool.setdefault("packages", []).append(relative_path.as_posix())
-        TOMLFile(self.path / "pyproject.toml").write(self._pyproject)
+        with self._edit_tool() as tool:
+            tool.setdefault("packages", []).append(relative_path.as_posix())
 
     def add_explicit_package_path(self, package_path: Path) -> None:
         relative_path = (
@@ -109,20 +175,66 @@ class Config:
         )
         if relative_path in self.package_paths:
             return
-        self._tool.setdefault("packages", []).append(relative_path.as_posix())
-        TOMLFile(self.path / "pyproject.toml").write(self._pyproject)
+        with self._edit_tool() as tool:
+            tool.setdefault("packages", []).append(relative_path.as_posix())
 
     def iter_packages(self) -> Iterable[PyPackage]:
-        """Iterate over the packages in the monorepo"""
-        from monas.project import PyPackage
+        """Iterate over the packages in the monorepo
 
+        Packages whose metadata files are unchanged are loaded from the index
+        without parsing the metadata. The rest are parsed in worker processes
+        if there are many of them.
+        """
+        from monas.project import PyPackage, read_package_record
+
+        candidates: list[tuple[str, Path, Fingerprint]] = []
         for p in self.package_paths:
             child_pkgs = list(p.parent.glob(p.name))
             for package in child_pkgs:
-                if package.is_dir():
-                    pypackage = PyPackage(self, package)
-                    if pypackage.metadata.path.is_file():
-                        yield pypackage
+                if not package.is_dir():
+                    continue
+                fingerprint = get_fingerprint(package)
+                if not any(fingerprint):
+                    continue
+                key = Path(os.path.relpath(package, self.path)).as_posix()
+                candidates.append((key, package, fingerprint))
+
+        records = {key: self.index.get(key, fp) for key, _, fp in candidates}
+        missing = [package for key, package, _ in candidates if records[key] is None]
+        if len(missing) >= PARALLEL_THRESHOLD and self.concurrency > 1:
+            with ProcessPoolExecutor(min(self.concurrency, len(missing))) as pool:
+                chunksize = max(1, len(missing) // (self.concurrency * 4))
+                results = list(
+                    pool.map(read_package_record, missing, chunksize=chunksize)
+                )
+        else:
+            results = [read_package_record(package) for package in missing]
+        loaded = dict(zip(missing, results))
+
+        for key, package, fingerprint in candidates:
+            record = records[key]
+            if record is None:
+                record = loaded[package]
+                if record is None:
+                    continue
+                self.index.set(key, fingerprint, record)
+            yield PyPackage(self, package, record)
+        self.index.prune(set(records))
+        self.index.save()
+
+    def get_graph(self) -> WorkspaceGraph:
+        """Get the dependency graph of the packages, which is built only once
+        and shared by all commands in the same invocation.
+        """
+        from monas.graph import WorkspaceGraph
+
+        if self._graph is None:
+            self._graph = WorkspaceGraph(self.iter_packages())
+        return self._graph
+
+    def reset_graph(self) -> None:
+        """Discard the dependency graph after the package metadata is changed"""
+        self._graph = None
 
 
 pass_config = click.make_pass_decorator(Config, ensure=True)
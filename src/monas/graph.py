@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import typing
+from typing import Collection, Iterable
+
+if typing.TYPE_CHECKING:
+    from monas.project import PyPackage
+
+
+class WorkspaceGraph:
+    """The dependency graph between packages in the monorepo.
+
+    It is built once from the workspace packages, with adjacency lists keyed by
+    the canonical package names. Transitive closures are memoized.
+    """
+
+    def __init__(self, packages: Iterable[PyPackage]) -> None:
+        self.packages: dict[str, PyPackage] = {}
+        for package in packages:
+            self.packages.setdefault(package.canonical_name, package)
+        self.dependencies: dict[str, list[str]] = {
+            name: [
+                dep for dep in package.get_dependency_names() if dep in self.packages
+            ]
+            for name, package in self.packages.items()
+        }
+        self._closures: dict[str, list[str]] = {}
+
+    def _get_closure(
+        self, name: str, visiting: list[str]
+    ) -> tuple[list[str], set[str]]:
+        """Return the closure of the package and the packages being visited that
+        it depends on through a cycle, which are missing from the closure.
+
+        A closure is only memoized when nothing is missing from it.
+        """
+        if name in self._closures:
+            return self._closures[name], set()
+        visiting.append(name)
+        result: list[str] = []
+        pending: set[str] = set()
+        for dep in self.dependencies[name]:
+            if dep == name:
+                raise ValueError(
+                    f"{self.packages[name].name} cannot have a dependency on itself"
+                )
+            if dep in visiting:
+                pending.add(dep)
+                if dep not in result:
+                    result.append(dep)
+                continue
+            closure, dep_pending = self._get_closure(dep, visiting)
+            pending.update(dep_pending)
+            for item in [*closure, dep]:
+                if item not in result:
+                    result.append(item)
+        visiting.pop()
+        pending.discard(name)
+        result = [item for item in result if item != name]
+        if not pending:
+            self._closures[name] = result
+        return result, pending
+
+    def get_local_dependencies(self, name: str) -> list[PyPackage]:
+        """Return the local packages the given package depends on, transitively.
+
+        Dependencies always come before the packages depending on them.
+
+        Args:
+            name: The canonical name of the package
+        """
+        return [self.packages[dep] for dep in self._get_closure(name, [])[0]]
+
+    def get_critical_path_lengths(self, names: Collection[str]) -> dict[str, int]:
+        """Return the length of the longest chain of packages depending on each
+        package, counting itself, within the given names.
+
+        Scheduling the packages with longer chains first shortens the total time.
+        """
+        dependents: dict[str, list[str]] = {name: [] for name in names}
+        for name in names:
+            for dep in self._get_closure(name, [])[0]:
+                if dep in dependents:
+                    dependents[dep].append(name)
+        result: dict[str, int] = {}
+
+        def visit(name: str, visiting: set[str]) -> int:
+            if name not in result:
+                visiting.add(name)
+                result[name] = 1 + max(
+                    (visit(d, visiting) for d in dependents[name] if d not in visiting),
+                    default=0,
+                )
+                visiting.discard(name)
+            return result[name]
+
+        for name in names:
+            visit(name, set())
+        return result
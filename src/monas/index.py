@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import typing
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any, Iterable, List, Optional
+
+if typing.TYPE_CHECKING:
+    from monas.metadata import Metadata
+
+INDEX_VERSION = 3
+METADATA_FILES = ("pyproject.toml", "setup.cfg")
+
+Fingerprint = List[Optional[List[int]]]
+
+
+class PackageRecord:
+    """A compact record of the package fields that monas reads.
+
+    It is what the index stores and what worker processes return,
+    the full metadata document is only loaded when a package is modified.
+    """
+
+    __slots__ = ("dependencies", "metadata", "name", "requirements", "version")
+
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        metadata: str,
+        dependencies: Iterable[str],
+        requirements: Iterable[str],
+    ) -> None:
+        self.name = name
+        self.version = version
+        self.metadata = metadata
+        #: The canonical names of dependencies
+        self.dependencies = tuple(dependencies)
+        #: The dependency requirement strings
+        self.requirements = tuple(requirements)
+
+    def __repr__(self) -> str:
+        return f"<PackageRecord {self.name} {self.version}>"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PackageRecord):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    # Records are mutable, they compare by value but are not hashable
+    __hash__ = None  # type: ignore[assignment]
+
+    @classmethod
+    def from_metadata(cls, metadata: Metadata) -> PackageRecord:
+        return cls(
+            metadata.package_name,
+            metadata.version,
+            metadata.name,
+            metadata.get_dependency_names(),
+            metadata.get_dependencies(),
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> PackageRecord:
+        return cls(
+            data["name"],
+            data["version"],
+            data["metadata"],
+            data["dependencies"],
+            data["requirements"],
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "metadata": self.metadata,
+            "dependencies": list(self.dependencies),
+            "requirements": list(self.requirements),
+        }
+
+
+def get_fingerprint(package_path: Path) -> Fingerprint:
+    """Get the stat data(mtime and size) of the metadata files of a package.
+
+    A missing file is recorded as None.
+    """
+    result: Fingerprint = []
+    for filename in METADATA_FILES:
+        try:
+            stat = os.stat(package_path / filename)
+        except (FileNotFoundError, NotADirectoryError):
+            result.append(None)
+        else:
+            result.append([stat.st_mtime_ns, stat.st_size])
+    return result
+
+
+class PackageIndex:
+    """A persistent index of the workspace packages.
+
+    It is stored at `.monas/index.json` under the monorepo root, and maps the
+    relative path of each package to the record read from its metadata.
+    An entry is only trusted when the stat data of the metadata files is unchanged.
+    Like the git index, entries of files modified no earlier than the index itself
+    was written are considered racy and always re-read.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.path = root / ".monas" / "index.json"
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._timestamp = 0
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with self.path.open(encoding="utf-8") as f:
+                data = json.load(f)
+            self._timestamp = os.stat(self.path).st_mtime_ns
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return
+        self._entries = data.get("packages", {})
+
+    def get(self, key: str, fingerprint: Fingerprint) -> PackageRecord | None:
+        """Get the cached record of the package if it is still valid.
+
+        Args:
+            key: The relative path of the package
+            fingerprint: The current fingerprint of the package
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.get("stat") != fingerprint:
+            return None
+        if any(stat is not None and stat[0] >= self._timestamp for stat in fingerprint):
+            return None
+        return PackageRecord.from_dict(entry["record"])
+
+    def set(self, key: str, fingerprint: Fingerprint, record: PackageRecord) -> None:
+        """Store the record of the package"""
+        with self._lock:
+            self._entries[key] = {"stat": fingerprint, "record": record.to_dict()}
+            self._dirty = True
+
+    def prune(self, keys: set[str]) -> None:
+        """Remove entries that are not in the given keys"""
+        with self._lock:
+            for key in list(self._entries):
+                if key not in keys:
+                    del self._entries[key]
+                    self._dirty = True
+
+    def save(self) -> None:
+        """Write the index to disk if it has changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": INDEX_VERSION, "packages": self._entries}
+            try:
+                self.path.parent.mkdir(exist_ok=True)
+                with NamedTemporaryFile(
+                    "w", dir=self.path.parent, suffix=".tmp", delete=False
+                ) as f:
+                    json.dump(data, f)
+                os.replace(f.name, self.path)
+            except OSError:
+                # The index is only an optimization, never fail the command
+                return
+            self._timestamp = os.stat(self.path).st_mtime_ns
+            self._dirty = False
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any, Iterable, NamedTuple
+
+import tomlkit
+from packaging.markers import Marker
+from packaging.requirements import Requirement
+from packaging.utils import canonicalize_name
+
+from monas.utils import read_toml, requirements_file, run_command
+
+LOCK_FILENAME = "monas.lock"
+LOCK_VERSION = 1
+LOCK_HEADER = "This file is generated by `monas lock`, do not edit it manually."
+
+
+class LockError(Exception):
+    """The requirements can't be satisfied by the lock file"""
+
+
+class LockedPackage(NamedTuple):
+    name: str
+    version: str
+    #: The URL of a direct reference, or None for packages from the index
+    url: str | None
+    hashes: list[str]
+    #: Requirements on other locked packages, as canonical names with extras
+    dependencies: list[str]
+    #: The additional dependencies of each extra
+    extras: dict[str, list[str]]
+
+    def as_requirement(self, with_hashes: bool = True) -> str:
+        """Return the pinned requirement line of the package"""
+        if self.url is not None:
+            line = f"{self.name} @ {self.url}"
+        else:
+            line = f"{self.name}=={self.version}"
+        if with_hashes and self.hashes:
+            line += "".join(f" --hash={h}" for h in self.hashes)
+        return line
+
+
+def resolve_requirements(
+    requirements: Iterable[str], python: Path, options: Iterable[str] = ()
+) -> dict[str, Any]:
+    """Resolve the requirements with pip without installing anything.
+
+    Args:
+        requirements: The requirements to resolve
+        python: The interpreter to resolve for, which is also the environment
+            the markers are evaluated in
+        options: Extra pip options, as lines of the requirements file
+
+    Returns:
+        The installation report of pip, see
+        https://pip.pypa.io/en/stable/reference/installation-report/
+    """
+    with TemporaryDirectory(prefix="monas-") as tempdir, requirements_file(
+        [*options, *requirements]
+    ) as filename:
+        report = os.path.join(tempdir, "report.json")
+        run_command(
+            [
+                str(python),
+                "-Im",
+                "pip",
+                "install",
+                "--dry-run",
+                "--ignore-installed",
+                "--quiet",
+                "--report",
+                report,
+                "-r",
+                filename,
+            ]
+        )
+        with open(report, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def _evaluate(marker: Marker | None, environment: dict[str, str], extra: str) -> bool:
+    if marker is None:
+        return True
+    return marker.evaluate({**environment, "extra": extra})
+
+
+def _get_direct_url(download_info: dict[str, Any]) -> str:
+    """Get the URL of a direct reference from the download info of pip, see
+    https://packaging.python.org/en/latest/specifications/direct-url/
+    """
+    url = download_info["url"]
+    vcs_info = download_info.get("vcs_info")
+    if vcs_info is not None:
+        url = f"{vcs_info['vcs']}+{url}@{vcs_info['commit_id']}"
+    if "subdirectory" in download_info:
+        url += f"#subdirectory={download_info['subdirectory']}"
+    return url
+
+
+def _format_dependency(req: Requirement) -> str:
+    name = canonicalize_name(req.name)
+    if req.extras:
+        return f"{name}[{','.join(sorted(req.extras))}]"
+    return name
+
+
+class Lockfile:
+    """The resolved external dependencies of all workspace packages.
+
+    Args:
+        requirements: The requirements that were resolved
+        packages: The locked packages, keyed by canonical names
+        environment: The marker environment the requirements were resolved in
+    """
+
+    def __init__(
+        self,
+        requirements: list[str],
+        packages: dict[str, LockedPackage],
+        environment: dict[str, str] | None = None,
+    ) -> None:
+        self.requirements = requirements
+        self.packages = packages
+        self.environment = environment or {}
+
+    @classmethod
+    def from_report(cls, requirements: list[str], report: dict[str, Any]) -> Lockfile:
+        """Create a lock file from the installation report of pip"""
+        environment = report.get("environment", {})
+        packages: dict[str, LockedPackage] = {}
+        for item in report["install"]:
+            metadata = item["metadata"]
+            download_info = item["download_info"]
+            archive_info = download_info.get("archive_info", {})
+            hashes = [
+                f"{algo}:{value}"
+                for algo, value in sorted(archive_info.get("hashes", {}).items())
+            ]
+            if not hashes and "hash" in archive_info:
+                hashes = [archive_info["hash"].replace("=", ":", 1)]
+            dependencies: list[str] = []
+            extras: dict[str, list[str]] = {}
+            provides_extra = metadata.get("provides_extra", [])
+            for line in metadata.get("requires_dist", []):
+                req = Requirement(line)
+                dependency = _format_dependency(req)
+                if _evaluate(req.marker, environment, ""):
+                    dependencies.append(dependency)
+                    continue
+                for extra in provides_extra:
+                    if _evaluate(req.marker, environment, extra):
+                        extras.setdefault(canonicalize_name(extra), []).append(
+                            dependency
+                        )
+            packages[canonicalize_name(metadata["name"])] = LockedPackage(
+                metadata["name"],
+                metadata["version"],
+                _get_direct_url(download_info) if item.get("is_direct") else None,
+                hashes,
+                dependencies,
+                extras,
+            )
+        return cls(requirements, packages, environment)
+
+    @classmethod
+    def load(cls, path: Path) -> Lockfile:
+        """Read the lock file at the given path"""
+        data = read_toml(path)
+        if data.get("metadata", {}).get("version") != LOCK_VERSION:
+            raise LockError(f"Unsupported lock file version: {path}")
+        packages: dict[str, LockedPackage] = {}
+        for item in data.get("package", []):
+            packages[canonicalize_name(item["name"])] = LockedPackage(
+                item["name"],
+                item["version"],
+                item.get("url"),
+                item.get("hashes", []),
+                item.get("dependencies", []),
+                item.get("extras", {}),
+            )
+        return cls(
+            data["metadata"].get("requirements", []),
+            packages,
+            data["metadata"].get("environment", {}),
+        )
+
+    def write(self, path: Path) -> None:
+        """Write the lock file to the given path"""
+        doc = tomlkit.document()
+        doc.add(tomlkit.comment(LOCK_HEADER))
+        metadata = tomlkit.table()
+        metadata["version"] = LOCK_VERSION
+        metadata["requirements"] = tomlkit.array().multiline(True)
+        metadata["requirements"].extend(self.requirements)
+        metadata["environment"] = self.environment
+        doc["metadata"] = metadata
+        packages = tomlkit.aot()
+        for _, package in sorted(self.packages.items()):
+            table = tomlkit.table()
+            table["name"] = package.name
+            table["version"] = package.version
+            if package.url is not None:
+                table["url"] = package.url
+            table["hashes"] = package.hashes
+            table["dependencies"] = package.dependencies
+            if package.extras:
+                table["extras"] = package.extras
+            packages.append(table)
+        doc["package"] = packages
+        path.write_text(tomlkit.dumps(doc), encoding="utf-8")
+
+    def get_requirements(self, requirements: Iterable[str]) -> list[str]:
+        """Get the pinned requirement lines to install the given requirements
+        and their dependencies, with hashes when all of them have.
+
+        The markers are evaluated in the environment the lock was resolved in.
+
+        Raises:
+            LockError: If any requirement is missing from the lock file
+        """
+        closure: dict[str, LockedPackage] = {}
+        stack: list[tuple[str, Requirement]] = []
+        for line in requirements:
+            req = Requirement(line)
+            if _evaluate(req.marker, self.environment, ""):
+                stack.append((line, req))
+        visited: set[tuple[str, frozenset[str]]] = set()
+        while stack:
+            line, req = stack.pop()
+            name = canonicalize_name(req.name)
+            extras = frozenset(canonicalize_name(e) for e in req.extras)
+            if (name, extras) in visited:
+                continue
+            visited.add((name, extras))
+            package = self.packages.get(name)
+            if package is None:
+                raise LockError(f"{line} is not found in the lock file")
+            closure[name] = package
+            dependencies = list(package.dependencies)
+            for extra in extras:
+                dependencies.extend(package.extras.get(extra, []))
+            stack.extend((dep, Requirement(dep)) for dep in dependencies)
+        # pip can't mix hashed requirements with unhashed ones
+        with_hashes = all(package.hashes for package in closure.values())
+        return [
+            package.as_requirement(with_hashes)
+            for _, package in sorted(closure.items())
+        ]
@@ -53,6 +53,11 @@ class Metadata(metaclass=abc.ABCMeta):
         """Remove a dependency from the project"""
         pass
 
+    @abc.abstractmethod
+    def get_dependencies(self) -> list[str]:
+        """Get a list of dependency requirement strings(PEP 508)"""
+        pass
+
     @abc.abstractmethod
     def get_dependency_names(self) -> list[str]:
         """Get a list of canonicalized dependency names"""
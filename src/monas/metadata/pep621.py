@@ -10,6 +10,7 @@ from tomlkit.toml_file import TOMLFile
 
 from monas.metadata.base import Metadata
 from monas.questions import InputMetadata
+from monas.utils import read_toml
 
 
 class PEP621Metadata(Metadata):
@@ -19,16 +20,24 @@ class PEP621Metadata(Metadata):
     def __init__(self, root: Path) -> None:
         super().__init__(root)
         self._data = self._read()
+        self._document: tomlkit.TOMLDocument | None = None
 
     @classmethod
     def match(cls, pyproject_data: dict) -> bool:
         return bool(pyproject_data.get("project", {}).get("name"))
 
-    def _read(self) -> tomlkit.TOMLDocument:
-        return TOMLFile(self.path).read()
+    def _read(self) -> dict[str, Any]:
+        return read_toml(self.path)
+
+    def _get_document(self) -> tomlkit.TOMLDocument:
+        """Get the style-preserving TOML document for modification"""
+        if self._document is None:
+            self._document = TOMLFile(self.path).read()
+        return self._document
 
     def _write(self) -> None:
-        TOMLFile(self.path).write(self._data)
+        TOMLFile(self.path).write(self._get_document())
+        self._data = self._read()
 
     @property
     def version(self) -> str:
@@ -40,7 +49,7 @@ class PEP621Metadata(Metadata):
 
     @version.setter
     def version(self, value: str) -> None:
-        self._data["project"]["version"] = value
+        self._get_document()["project"]["version"] = value
         self._write()
 
     @classmethod
@@ -73,10 +82,13 @@ class PEP621Metadata(Metadata):
         doc.append("project", pep621_data)
         return tomlkit.dumps(doc)
 
+    def get_dependencies(self) -> list[str]:
+        return list(self._data["project"].get("dependencies", []))
+
     def get_dependency_names(self) -> list[str]:
         return [
             canonicalize_name(Requirement(dependency).name)
-            for dependency in self._data["project"].get("dependencies", [])
+            for dependency in self.get_dependencies()
         ]
 
     def add_dependency(self, dependency: str) -> None:
@@ -89,7 +101,7 @@ class PEP621Metadata(Metadata):
         dependencies.append(dependency)
         array = tomlkit.array().multiline(True)
         array.extend(dependencies)
-        self._data["project"]["dependencies"] = array
+        self._get_document()["project"]["dependencies"] = array
         self._write()
 
     def remove_dependency(self, dependency: str) -> None:
@@ -101,7 +113,7 @@ class PEP621Metadata(Metadata):
         ]
         array = tomlkit.array().multiline(True)
         array.extend(dependencies)
-        self._data["project"]["dependencies"] = array
+        self._get_document()["project"]["dependencies"] = array
         self._write()
 
     def get_template_args(self) -> dict[str, Any]:
@@ -94,6 +94,9 @@ class SetupCfgMetadata(Metadata):
             ),
         )
 
+    def get_dependencies(self) -> list[str]:
+        return list(self._get_dependencies())
+
     def get_dependency_names(self) -> list[str]:
         return [
             canonicalize_name(Requirement(dependency.strip()).name)
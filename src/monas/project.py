@@ -3,16 +3,32 @@ from __future__ import annotations
 import textwrap
 from pathlib import Path
 from shlex import join as sh_join
-from typing import Type, cast
+from typing import Sequence, Type, cast
 
 import tomlkit
 from packaging.utils import canonicalize_name
 from tomlkit.toml_file import TOMLFile
 
 from monas.config import Config
+from monas.index import PackageRecord
+from monas.lock import Lockfile
 from monas.metadata import ALL_METADATA_CLASSES, Metadata
 from monas.questions import InputMetadata
-from monas.utils import pip_install
+from monas.utils import (
+    clone_virtualenv,
+    ensure_virtualenv,
+    ensure_virtualenv_template,
+    get_install_stamp,
+    get_site_packages,
+    link_package,
+    pip_install,
+    pip_uninstall,
+    read_install_stamp,
+    read_toml,
+    run_sync,
+    unlink_packages,
+    write_install_stamp,
+)
 
 BUILD_BACKENDS = {
     "setuptools": {
@@ -72,30 +88,82 @@ def get_metadata_class_for_backend(name: str) -> type[Metadata]:
     return cast(Type[Metadata], result)
 
 
+def get_metadata(path: Path, metadata_name: str | None = None) -> Metadata:
+    """Get the metadata of the package at the given path.
+
+    Args:
+        path: The path to the package
+        metadata_name: The name of the metadata type, detected from
+            the pyproject.toml if not given
+    """
+    if metadata_name is not None:
+        result = next(
+            (cls for cls in ALL_METADATA_CLASSES if cls.name == metadata_name), None
+        )
+        if result is not None:
+            return cast(Type[Metadata], result)(path)
+    try:
+        pyproject_data = read_toml(path / "pyproject.toml")
+    except FileNotFoundError:
+        pyproject_data = {}
+    result = next(
+        (cls for cls in ALL_METADATA_CLASSES if cls.match(pyproject_data)), None
+    )
+    if result is None:
+        raise ValueError("Can't determine a metadata type from the pyproject.toml")
+    return cast(Type[Metadata], result)(path)
+
+
+def read_package_record(path: Path) -> PackageRecord | None:
+    """Read the package record from the metadata files.
+
+    Return None if no metadata file is found under the path. This is a top-level
+    function so that it can be run in worker processes.
+    """
+    metadata = get_metadata(path)
+    if not metadata.path.is_file():
+        return None
+    return PackageRecord.from_metadata(metadata)
+
+
 class PyPackage:
-    """A Python project managed by Monas"""
+    """A Python project managed by Monas
 
-    def __init__(self, config: Config, path: Path) -> None:
+    Args:
+        config: The monas configuration
+        path: The path to the package
+        record: The package record, read from the metadata if not given
+    """
+
+    def __init__(
+        self, config: Config, path: Path, record: PackageRecord | None = None
+    ) -> None:
         self.config = config
         self.path = path
-        self.metadata = self._get_metadata()
+        self._record = record
+        self._metadata: Metadata | None = None
 
-    def _get_metadata(self) -> Metadata:
-        try:
-            pyproject_data = TOMLFile(self.path / "pyproject.toml").read()
-        except FileNotFoundError:
-            pyproject_data = {}
-        result = next(
-            (cls for cls in ALL_METADATA_CLASSES if cls.match(pyproject_data)), None
-        )
-        if result is None:
-            raise ValueError("Can't determine a metadata type from the pyproject.toml")
-        return cast(Type[Metadata], result)(self.path)
+    @property
+    def metadata(self) -> Metadata:
+        """The metadata of the package, which is loaded on first access"""
+        if self._metadata is None:
+            if self._record is not None:
+                self._metadata = get_metadata(self.path, self._record.metadata)
+            else:
+                self._metadata = get_metadata(self.path)
+        return self._metadata
+
+    @property
+    def record(self) -> PackageRecord:
+        """The compact record of the fields read from the metadata"""
+        if self._record is None:
+            self._record = PackageRecord.from_metadata(self.metadata)
+        return self._record
 
     @property
     def name(self) -> str:
         """Get the project name"""
-        return self.metadata.package_name
+        return self.record.name
 
     @property
     def canonical_name(self) -> str:
@@ -105,11 +173,20 @@ class PyPackage:
     @property
     def version(self) -> str:
         """Get the project version"""
-        return self.metadata.version
+        return self.record.version
+
+    def get_dependencies(self) -> list[str]:
+        """Get a list of dependency requirement strings(PEP 508)"""
+        return list(self.record.requirements)
+
+    def get_dependency_names(self) -> list[str]:
+        """Get a list of canonicalized dependency names"""
+        return list(self.record.dependencies)
 
     def set_version(self, version: str) -> None:
         """Set the project version"""
         self.metadata.version = version
+        self._record = None
 
     @classmethod
     def create(cls, config: Config, path: Path, inputs: InputMetadata) -> None:
@@ -144,6 +221,8 @@ class PyPackage:
             dependency: A requirement string(PEP 508)
         """
         self.metadata.add_dependency(dependency)
+        self._record = None
+        self.config.reset_graph()
 
     def remove_dependency(self, dependency: str) -> None:
         """Remove a dependency from the project.
@@ -152,36 +231,144 @@ class PyPackage:
             dependency: A canonicalized requirement name
         """
         self.metadata.remove_dependency(dependency)
+        self._record = None
+        self.config.reset_graph()
 
-    def install(self) -> None:
-        """Bootstrap the package and link depending packages in the monorepo"""
-        local_dependencies = self.get_local_dependencies([self])
+    async def install(
+        self,
+        force: bool = False,
+        options: Sequence[str] = (),
+        link: bool = False,
+        lock: Lockfile | None = None,
+    ) -> bool:
+        """Bootstrap the package and link depending packages in the monorepo
+
+        Args:
+            force: Run the installation even if the venv is up to date
+            options: Extra pip options, as lines of the requirements file
+            link: Link the local packages with .pth files instead of installing
+                them in editable mode with pip
+            lock: Install the external dependencies pinned in the lock file
+                instead of resolving them
+
+        Returns:
+            False if the installation is skipped
+        """
+        if link:
+            return await self._install_linked(force, options, lock)
+        local_dependencies = [*self.get_local_dependencies(), self]
         requirements = [
-            sh_join(["-e", pkg.path.as_posix()]) for pkg in local_dependencies
+            *options,
+            *(sh_join(["-e", pkg.path.as_posix()]) for pkg in local_dependencies),
         ]
-        pip_install(self.path / ".venv", requirements)
+        locked = self._get_locked_requirements(lock) if lock is not None else []
+        venv_path = self.path / ".venv"
+        stamp = get_install_stamp(
+            [*locked, *requirements], [pkg.path for pkg in local_dependencies]
+        )
+        if not force and read_install_stamp(venv_path) == stamp:
+            return False
+        await self._prepare_venv(venv_path)
+        if lock is None:
+            await pip_install(
+                venv_path, requirements, python_version=self.config.python_version
+            )
+        else:
+            if locked:
+                await pip_install(
+                    venv_path,
+                    [*options, *locked],
+                    no_deps=True,
+                    python_version=self.config.python_version,
+                )
+            await pip_install(
+                venv_path,
+                requirements,
+                no_deps=True,
+                python_version=self.config.python_version,
+            )
+        write_install_stamp(venv_path, stamp)
+        return True
+
+    def _get_locked_requirements(self, lock: Lockfile) -> list[str]:
+        """Get the pinned external requirements of the package and its local
+        dependencies from the lock file.
+        """
+        from monas.requirements import get_external_requirements
 
-    def get_local_dependencies(
-        self,
-        local_dependencies: list[PyPackage] | None = None,
-    ) -> list[PyPackage]:
-        """Return list of local dependencies.
+        return lock.get_requirements(
+            get_external_requirements(self.config.get_graph(), [self])
+        )
 
-        Args:
-            local_dependencies: Accumulated list of local depencies to install
+    async def _prepare_venv(self, venv_path: Path) -> None:
+        if self.config.clone_venvs and not venv_path.exists():
+            template = await run_sync(
+                ensure_virtualenv_template,
+                self.config.get_venv_template(),
+                self.config.python_version,
+            )
+            await run_sync(clone_virtualenv, template, venv_path)
+
+    async def _install_linked(
+        self, force: bool, options: Sequence[str], lock: Lockfile | None
+    ) -> bool:
+        """Install the external dependencies with pip and link the local packages.
+
+        Pip only runs when the external requirements change, so relinking after
+        local dependencies change is just writing files.
+        """
+        from monas.requirements import get_external_requirements
+
+        local_dependencies = [*self.get_local_dependencies(), self]
+        if lock is not None:
+            requirements = self._get_locked_requirements(lock)
+        else:
+            requirements = get_external_requirements(self.config.get_graph(), [self])
+        venv_path = self.path / ".venv"
+        stamp = get_install_stamp([*options, *requirements], [])
+        installed = False
+        if force or read_install_stamp(venv_path) != stamp:
+            await self._prepare_venv(venv_path)
+            if requirements and lock is not None:
+                await pip_install(
+                    venv_path,
+                    [*options, *requirements],
+                    no_deps=True,
+                    python_version=self.config.python_version,
+                )
+            elif requirements:
+                await pip_install(
+                    venv_path,
+                    [*options, *requirements],
+                    python_version=self.config.python_version,
+                )
+            else:
+                await run_sync(ensure_virtualenv, venv_path, self.config.python_version)
+            write_install_stamp(venv_path, stamp)
+            installed = True
+        site_packages = get_site_packages(venv_path)
+        conflicts = unlink_packages(
+            site_packages,
+            {pkg.canonical_name: pkg.version for pkg in local_dependencies},
+        )
+        if conflicts:
+            await pip_uninstall(venv_path, conflicts)
+        linked = False
+        for pkg in local_dependencies:
+            linked = (
+                link_package(
+                    site_packages,
+                    pkg.name,
+                    pkg.version,
+                    pkg.path,
+                    pkg.get_dependencies(),
+                )
+                or linked
+            )
+        return installed or linked
+
+    def get_local_dependencies(self) -> list[PyPackage]:
+        """Return list of local dependencies, which are ordered so that
+        dependencies come before the packages depending on them.
         """
-        if not local_dependencies:
-            local_dependencies = []
-        dependency_names = self.metadata.get_dependency_names()
-        local_packages = list(self.config.iter_packages())
-        for pkg in local_packages:
-            pkg_name = pkg.canonical_name
-            if pkg_name not in dependency_names:
-                continue
-            if pkg_name == self.canonical_name:
-                raise ValueError(f"{self.name} cannot have a dependency on itself")
-            if pkg_name in [ld.canonical_name for ld in local_dependencies]:
-                continue
-            local_dependencies = [pkg, *local_dependencies]
-            local_dependencies = pkg.get_local_dependencies(local_dependencies)
-        return local_dependencies
+        return self.config.get_graph().get_local_dependencies(self.canonical_name)
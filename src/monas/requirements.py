@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import functools
+import os
+from pathlib import Path
+from typing import Iterable, NamedTuple, Tuple
+
+from packaging.markers import default_environment
+from packaging.requirements import Requirement
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+
+from monas.graph import WorkspaceGraph
+from monas.project import PyPackage
+from monas.utils import read_toml
+
+# The build requirements and backend assumed by pip when no [build-system] table
+# is present
+DEFAULT_BUILD_REQUIRES = ["setuptools>=40.8.0", "wheel"]
+DEFAULT_BUILD_BACKEND = "setuptools.build_meta:__legacy__"
+
+Environment = Tuple[Tuple[str, str], ...]
+
+
+@functools.lru_cache(maxsize=None)
+def parse_requirement(line: str) -> Requirement:
+    """Parse the requirement string, each distinct string is parsed only once"""
+    return Requirement(line)
+
+
+def iter_external_requirements(
+    graph: WorkspaceGraph, packages: Iterable[PyPackage]
+) -> Iterable[tuple[PyPackage, Requirement]]:
+    """Iterate over the requirements that are not satisfied by workspace packages,
+    of the given packages and their local dependencies.
+
+    Each package in the closure is visited only once.
+    """
+    seen: set[str] = set()
+    for package in packages:
+        for pkg in [*graph.get_local_dependencies(package.canonical_name), package]:
+            if pkg.canonical_name in seen:
+                continue
+            seen.add(pkg.canonical_name)
+            for dependency in pkg.get_dependencies():
+                req = parse_requirement(dependency)
+                if canonicalize_name(req.name) not in graph.packages:
+                    yield pkg, req
+
+
+def get_external_requirements(
+    graph: WorkspaceGraph, packages: Iterable[PyPackage]
+) -> list[str]:
+    """Get the union of external requirements of the packages and their local
+    dependencies, as sorted unique requirement strings.
+    """
+    return sorted({str(req) for _, req in iter_external_requirements(graph, packages)})
+
+
+def get_workspace_constraints(graph: WorkspaceGraph) -> list[str]:
+    """Get the constraint lines that merge the specifiers of each external
+    dependency across all workspace packages.
+
+    Requirements with different markers are kept apart, while extras and
+    direct references are dropped since pip doesn't accept them as constraints.
+    """
+    specifiers: dict[tuple[str, str], SpecifierSet] = {}
+    for _, req in iter_external_requirements(graph, graph.packages.values()):
+        if req.url:
+            continue
+        key = (canonicalize_name(req.name), str(req.marker or ""))
+        specifiers[key] = specifiers.get(key, SpecifierSet()) & req.specifier
+    result: list[str] = []
+    for (name, marker), specifier in sorted(specifiers.items()):
+        if not specifier:
+            continue
+        result.append(
+            f"{name}{specifier}; {marker}" if marker else f"{name}{specifier}"
+        )
+    return result
+
+
+class BuildSystem(NamedTuple):
+    requires: list[str]
+    backend: str
+    #: The absolute paths to load an in-tree backend from
+    backend_path: list[str]
+
+
+def get_build_system(path: Path) -> BuildSystem:
+    """Read the [build-system] table of the package at the given path"""
+    try:
+        pyproject = read_toml(path / "pyproject.toml")
+    except FileNotFoundError:
+        pyproject = {}
+    build_system = pyproject.get("build-system", {})
+    return BuildSystem(
+        list(build_system.get("requires", DEFAULT_BUILD_REQUIRES)),
+        build_system.get("build-backend", DEFAULT_BUILD_BACKEND),
+        [os.path.normpath(path / p) for p in build_system.get("backend-path", [])],
+    )
+
+
+def get_build_requirements(packages: Iterable[PyPackage]) -> list[str]:
+    """Get the union of build-system requirements of the packages"""
+    result: set[str] = set()
+    for package in packages:
+        result.update(get_build_system(package.path).requires)
+    return sorted(result)
+
+
+def get_target_environment(python_version: str) -> Environment:
+    """Get the marker environment of the current platform with the given
+    Python version, in a hashable form.
+    """
+    environment = dict(default_environment())
+    if python_version != environment["python_version"]:
+        environment["python_version"] = python_version
+        environment["python_full_version"] = f"{python_version}.0"
+    return tuple(sorted(environment.items()))
+
+
+@functools.lru_cache(maxsize=None)
+def _applies(line: str, environment: Environment) -> bool:
+    marker = parse_requirement(line).marker
+    return marker is None or marker.evaluate({**dict(environment), "extra": ""})
+
+
+def _get_candidates(version: Version) -> list[Version]:
+    release = version.release
+    return [
+        version,
+        # A version just above the given one, that isn't a post-release of it
+        Version(".".join(map(str, (*release, *[0] * (8 - len(release)), 1)))),
+        Version(str(release[0] + 1)),
+    ]
+
+
+def is_satisfiable(specifier: SpecifierSet) -> bool:
+    """Check if any version satisfies the specifier set.
+
+    The candidates are the versions mentioned in the specifiers and their
+    neighbours, which is enough for the operators of PEP 440 to find a version
+    in any non-empty range.
+    """
+    candidates = [Version("0.dev0"), Version("0")]
+    try:
+        for spec in specifier:
+            if spec.operator == "===":
+                return True
+            candidates.extend(_get_candidates(Version(spec.version.rstrip(".*"))))
+    except InvalidVersion:
+        return True
+    return any(specifier.contains(c, prereleases=True) for c in candidates)
+
+
+class Conflict(NamedTuple):
+    name: str
+    #: The requirements in conflict, with the package declaring each of them
+    requirements: list[tuple[PyPackage, str]]
+    python_version: str
+
+
+def find_conflicts(
+    graph: WorkspaceGraph,
+    groups: Iterable[Iterable[PyPackage]],
+    python_versions: Iterable[str],
+) -> list[Conflict]:
+    """Find the external dependencies with incompatible specifiers.
+
+    Args:
+        graph: The workspace graph
+        groups: Each group is a list of packages to be installed together,
+            along with their local dependencies
+        python_versions: The Python versions to evaluate the markers with
+    """
+    environments = [(v, get_target_environment(v)) for v in python_versions]
+    groups = [list(iter_external_requirements(graph, group)) for group in groups]
+    result: list[Conflict] = []
+    seen: set[tuple[str, frozenset[str], str]] = set()
+    for python_version, environment in environments:
+        for requirements in groups:
+            by_name: dict[str, list[tuple[PyPackage, Requirement]]] = {}
+            for pkg, req in requirements:
+                if req.url or not _applies(str(req), environment):
+                    continue
+                by_name.setdefault(canonicalize_name(req.name), []).append((pkg, req))
+            for name, items in by_name.items():
+                specifier = SpecifierSet()
+                for _, req in items:
+                    specifier &= req.specifier
+                if is_satisfiable(specifier):
+                    continue
+                key = (name, frozenset(str(req) for _, req in items), python_version)
+                if key in seen:
+                    continue
+                seen.add(key)
+                result.append(
+                    Conflict(
+                        name, [(pkg, str(req)) for pkg, req in items], python_version
+                    )
+                )
+    return result
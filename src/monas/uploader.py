@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any, Iterable
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import requests
+from packaging.utils import (
+    InvalidSdistFilename,
+    InvalidWheelFilename,
+    parse_sdist_filename,
+    parse_wheel_filename,
+)
+from packaging.version import InvalidVersion, Version
+from rich.markup import escape
+from twine.commands.upload import skip_upload
+from twine.exceptions import RedirectDetected
+from twine.package import PackageFile
+from twine.repository import Repository
+from twine.settings import Settings
+from twine.utils import check_status_code, sanitize_url
+
+from monas.project import PyPackage
+from monas.utils import info, run_sync
+
+# The simple indexes of the repositories known by twine
+SIMPLE_INDEXES = {
+    "pypi": "https://pypi.org/simple/",
+    "testpypi": "https://test.pypi.org/simple/",
+}
+SIMPLE_JSON = "application/vnd.pypi.simple.v1+json"
+
+
+class UploadState:
+    """The files uploaded to each repository, so an interrupted upload
+    can be resumed without sending the same files again.
+
+    It is stored at `.monas/upload-state.json`, and maps the repository URL
+    to the sha256 digests of the uploaded files by file name. The files whose
+    upload has started but isn't known to be done are kept under `pending`.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.path = root / ".monas" / "upload-state.json"
+        self._lock = threading.Lock()
+        try:
+            with self.path.open(encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self._uploaded: dict[str, dict[str, str]] = data.get("uploaded", {})
+        self._pending: dict[str, dict[str, str]] = data.get("pending", {})
+
+    def is_uploaded(self, repository_url: str, path: Path, digest: str) -> bool:
+        """Check if the file with the same content has been uploaded"""
+        return self._uploaded.get(repository_url, {}).get(path.name) == digest
+
+    def is_pending(self, repository_url: str, path: Path, digest: str) -> bool:
+        """Check if the upload of the file with the same content was started
+        but not known to be done, so it may exist on the repository.
+        """
+        return self._pending.get(repository_url, {}).get(path.name) == digest
+
+    def start(self, repository_url: str, path: Path, digest: str) -> None:
+        """Record the file as pending before it is uploaded"""
+        with self._lock:
+            self._pending.setdefault(repository_url, {})[path.name] = digest
+            self._save()
+
+    def add(self, repository_url: str, path: Path, digest: str) -> None:
+        """Record the uploaded file and save the state to disk"""
+        with self._lock:
+            self._pending.get(repository_url, {}).pop(path.name, None)
+            self._uploaded.setdefault(repository_url, {})[path.name] = digest
+            self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(exist_ok=True)
+        with NamedTemporaryFile(
+            "w", dir=self.path.parent, suffix=".tmp", delete=False
+        ) as f:
+            json.dump(
+                {"uploaded": self._uploaded, "pending": self._pending}, f, indent=2
+            )
+        os.replace(f.name, self.path)
+
+
+def _file_digest(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class Uploader:
+    """Upload distributions to a repository with twine.
+
+    Each concurrent upload uses its own repository session, which is kept for
+    the following uploads, so connections to the index are reused. Files already
+    uploaded with the same content are skipped. A file whose upload was
+    interrupted is uploaded again with `skip_existing`, as it may have reached
+    the repository.
+
+    Args:
+        settings: The twine settings of the repository
+        state: The state recording the uploaded files
+        concurrency: The maximum number of concurrent uploads
+    """
+
+    def __init__(self, settings: Settings, state: UploadState, concurrency: int):
+        self.settings = settings
+        self.state = state
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._repositories: list[Repository] = []
+
+    def __enter__(self) -> Uploader:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def repository_url(self) -> str:
+        return sanitize_url(self.settings.repository_config["repository"])
+
+    def _acquire(self) -> Repository:
+        with self._lock:
+            if self._repositories:
+                return self._repositories.pop()
+        return self.settings.create_repository()
+
+    def _release(self, repository: Repository) -> None:
+        with self._lock:
+            self._repositories.append(repository)
+
+    def upload_file(self, path: Path) -> bool:
+        """Upload the distribution file.
+
+        Returns:
+            False if the file is skipped because it already exists
+        """
+        digest = _file_digest(path)
+        if self.state.is_uploaded(self.repository_url, path, digest):
+            return False
+        skip_existing = self.settings.skip_existing or self.state.is_pending(
+            self.repository_url, path, digest
+        )
+        package = PackageFile.from_filename(str(path), self.settings.comment)
+        with self._semaphore:
+            repository = self._acquire()
+            try:
+                self.state.start(self.repository_url, path, digest)
+                uploaded = self._upload(repository, package, skip_existing)
+            except BaseException:
+                repository.close()
+                raise
+            self._release(repository)
+        self.state.add(self.repository_url, path, digest)
+        return uploaded
+
+    def _upload(
+        self, repository: Repository, package: PackageFile, skip_existing: bool
+    ) -> bool:
+        if skip_existing and repository.package_is_uploaded(package):
+            return False
+        resp = repository.upload(package)
+        if resp.is_redirect:
+            raise RedirectDetected.from_args(
+                self.repository_url, sanitize_url(resp.headers["location"])
+            )
+        if skip_upload(resp, skip_existing, package):
+            return False
+        check_status_code(resp, self.settings.verbose)
+        return True
+
+    async def upload(self, paths: Iterable[Path]) -> list[Path]:
+        """Upload the distribution files concurrently.
+
+        Returns:
+            The files that are uploaded
+        """
+        paths = list(paths)
+        results = await asyncio.gather(
+            *(run_sync(self.upload_file, path) for path in paths)
+        )
+        return [path for path, uploaded in zip(paths, results) if uploaded]
+
+    def close(self) -> None:
+        """Close all repository sessions"""
+        with self._lock:
+            for repository in self._repositories:
+                repository.close()
+            self._repositories.clear()
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__()
+        self.filenames: list[str] = []
+        self._in_anchor = False
+
+    def handle_starttag(self, tag: str, attrs: Any) -> None:
+        self._in_anchor = tag == "a"
+
+    def handle_endtag(self, tag: str) -> None:
+        self._in_anchor = False
+
+    def handle_data(self, data: str) -> None:
+        if self._in_anchor and data.strip():
+            self.filenames.append(data.strip())
+
+
+def _parse_html_filenames(text: str) -> list[str]:
+    parser = _LinkParser()
+    parser.feed(text)
+    return parser.filenames
+
+
+def _get_local_filenames(index: Path, name: str) -> list[str]:
+    project_dir = index / name
+    if not project_dir.is_dir():
+        # A flat directory of distributions
+        return [p.name for p in index.iterdir()] if index.is_dir() else []
+    index_html = project_dir / "index.html"
+    if index_html.is_file():
+        return _parse_html_filenames(index_html.read_text(encoding="utf-8"))
+    return [p.name for p in project_dir.iterdir()]
+
+
+def _get_remote_filenames(
+    session: requests.Session, index: str, name: str
+) -> list[str]:
+    resp = session.get(
+        f"{index.rstrip('/')}/{name}/",
+        headers={"Accept": f"{SIMPLE_JSON}, text/html;q=0.1"},
+        timeout=30,
+    )
+    if resp.status_code == 404:
+        return []
+    resp.raise_for_status()
+    if resp.headers.get("Content-Type", "").startswith(SIMPLE_JSON):
+        return [f["filename"] for f in resp.json().get("files", [])]
+    return _parse_html_filenames(resp.text)
+
+
+def _parse_version(filename: str) -> tuple[str, Version] | None:
+    try:
+        if filename.endswith(".whl"):
+            name, version, *_ = parse_wheel_filename(filename)
+        else:
+            name, version = parse_sdist_filename(filename)
+    except (InvalidWheelFilename, InvalidSdistFilename, InvalidVersion):
+        return None
+    return name, version
+
+
+def get_published_packages(
+    index: str, packages: Iterable[PyPackage], concurrency: int
+) -> list[PyPackage]:
+    """Get the packages whose current versions exist on the simple index.
+
+    A package whose versions can't be looked up is assumed to be unpublished,
+    the upload then fails or is skipped by the repository.
+
+    Args:
+        index: The URL of the simple index, or the path to a local one, either
+            in the simple layout or a flat directory of distributions
+        packages: The packages to check
+        concurrency: The maximum number of concurrent requests
+    """
+    parsed = urlparse(index)
+    # Sessions are not thread-safe, each thread of the executor has its own
+    local = threading.local()
+    sessions: list[requests.Session] = []
+
+    def get_session() -> requests.Session:
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            sessions.append(local.session)
+        return local.session
+
+    def is_published(package: PyPackage) -> bool:
+        name = package.canonical_name
+        try:
+            version = Version(package.version)
+            if parsed.scheme in ("http", "https"):
+                filenames = _get_remote_filenames(get_session(), index, name)
+            elif parsed.scheme == "file":
+                filenames = _get_local_filenames(Path(url2pathname(parsed.path)), name)
+            else:
+                filenames = _get_local_filenames(Path(index), name)
+        except (
+            requests.RequestException,
+            InvalidVersion,
+            OSError,
+            KeyError,
+            ValueError,
+        ) as e:
+            info(
+                f"[notice]Can't check if {package.name} {package.version} is "
+                f"published, assume it isn't: {escape(str(e))}[/]"
+            )
+            return False
+        return (name, version) in filter(None, map(_parse_version, filenames))
+
+    packages = list(packages)
+    try:
+        with ThreadPoolExecutor(concurrency) as executor:
+            published = list(executor.map(is_published, packages))
+    finally:
+        for session in sessions:
+            session.close()
+    return [pkg for pkg, result in zip(packages, published) if result]
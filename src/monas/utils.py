@@ -1,17 +1,57 @@
 from __future__ import annotations
 
+import asyncio
+import codecs
+import functools
+import hashlib
+import heapq
+import json
 import os
+import re
+import shlex
+import shutil
 import subprocess
 import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from tempfile import NamedTemporaryFile
-from typing import Any, Iterable
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from typing import (
+    IO,
+    Any,
+    Awaitable,
+    Callable,
+    Generic,
+    Iterable,
+    Iterator,
+    Mapping,
+    TypeVar,
+)
 
 import click
-from rich.console import Console
+from packaging.utils import canonicalize_name
+from rich.console import Console, RenderableType
+from rich.live import Live
+from rich.markup import escape
+from rich.table import Table
 from rich.theme import Theme
 
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
 PROJECT_NAME = __name__.split(".")[0]
+INSTALL_STAMP = ".monas-install-stamp"
+TEMPLATE_PREFIX_FILE = ".monas-template-prefix"
+# Files that affect the installation of a package
+PACKAGE_FILES = ("pyproject.toml", "setup.cfg", "setup.py")
+# Longer output lines of commands are broken, so they are not held in memory
+MAX_LINE_LENGTH = 64 * 1024
+LINE_BREAK = re.compile(r"\r\n?|\n")
 THEME = Theme(
     {
         "primary": "cyan",
@@ -25,6 +65,8 @@ THEME = Theme(
 console = Console(theme=THEME)
 err_console = Console(theme=THEME, stderr=True)
 
+T = TypeVar("T")
+
 
 def info(msg: str) -> None:
     """Print info message."""
@@ -32,6 +74,15 @@ def info(msg: str) -> None:
     err_console.print(prefix + msg, highlight=False)
 
 
+def read_toml(path: Path) -> dict[str, Any]:
+    """Read a TOML file for read-only access.
+
+    It is much faster than tomlkit, use tomlkit only if the file is to be modified.
+    """
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
 def run_command(
     cmd: list[str],
     cwd: str | None = None,
@@ -46,6 +97,333 @@ def run_command(
         raise click.Abort() from None
 
 
+class CommandError(Exception):
+    """Raised when a command run by the job runner fails"""
+
+    def __init__(self, cmd: list[str], returncode: int) -> None:
+        super().__init__(f"Error running command {cmd}, exit code {returncode}")
+        self.cmd = cmd
+        self.returncode = returncode
+
+
+class DependencyFailed(Exception):
+    """Raised when a job can't start because a required job failed"""
+
+
+class OutputBuffer:
+    """Keep the last lines of the output in memory and spill all of them
+    to a log file, so the memory used per job is bounded.
+
+    Args:
+        log_path: The file to write the full output to, if any
+        maxlen: The number of lines kept in memory
+    """
+
+    #: Lines longer than this are truncated in memory
+    max_line_length = 1000
+
+    def __init__(self, log_path: Path | None = None, maxlen: int = 50) -> None:
+        self.log_path = log_path
+        self.lines: deque[str] = deque(maxlen=maxlen)
+        self._file: IO[str] | None = None
+
+    def write(self, line: str) -> None:
+        line = line.rstrip("\r\n")
+        if self.log_path is not None:
+            if self._file is None:
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = self.log_path.open("w", encoding="utf-8")
+            self._file.write(line + "\n")
+        self.lines.append(line[: self.max_line_length])
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove_log(self) -> None:
+        """Remove the log file left by an earlier run"""
+        if self.log_path is not None:
+            self.log_path.unlink(missing_ok=True)
+
+
+class Job:
+    """A unit of work run by :func:`run_jobs`
+
+    Args:
+        name: The name to display
+        func: The coroutine function to run
+        requires: The jobs that must succeed before this one starts
+        priority: Jobs with higher priority start first when ready
+        pool: The name of the pool the job belongs to, see :func:`run_jobs`
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        requires: Iterable[Job] = (),
+        priority: int = 0,
+        pool: str = "",
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.requires = list(requires)
+        self.priority = priority
+        self.pool = pool
+        self.state = "pending"
+        #: The last line of output or a status message
+        self.status = ""
+        self.result: Any = None
+        self.exception: BaseException | None = None
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.output = OutputBuffer()
+
+    def __repr__(self) -> str:
+        return f"<Job {self.name} {self.state}>"
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    async def run(self) -> None:
+        current_job.set(self)
+        self.output.remove_log()
+        self.state = "running"
+        self.started = time.monotonic()
+        try:
+            self.result = await self.func()
+        except Exception as e:
+            self.exception = e
+            self.state = "failed"
+        else:
+            self.state = "done"
+        finally:
+            self.finished = time.monotonic()
+            self.output.close()
+
+    def fail(self, exception: BaseException) -> None:
+        """Mark the job as failed without running it"""
+        self.exception = exception
+        self.state = "failed"
+
+
+#: The job being run in the current task
+current_job: ContextVar[Job | None] = ContextVar("current_job", default=None)
+
+
+class JobTable:
+    """A live table of the running jobs and a summary of the rest"""
+
+    def __init__(self, jobs: list[Job], title: str) -> None:
+        self.jobs = jobs
+        self.title = title
+
+    def __rich__(self) -> RenderableType:
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        for job in self.jobs:
+            counts[job.state] += 1
+        table = Table.grid(padding=(0, 1))
+        table.add_column("Name", style="primary", no_wrap=True)
+        table.add_column("Elapsed", justify="right", style="info")
+        table.add_column("Status", overflow="ellipsis", no_wrap=True)
+        table.add_row(
+            self.title,
+            "",
+            f"[succ]{counts['done']}[/] done, [danger]{counts['failed']}[/] failed, "
+            f"{counts['running']} running, {counts['pending']} pending",
+        )
+        max_rows = max(err_console.height - 2, 1)
+        running = [job for job in self.jobs if job.state == "running"]
+        for job in running[:max_rows]:
+            table.add_row(job.name, f"{job.elapsed:.1f}s", f"[info]{job.status}[/]")
+        if len(running) > max_rows:
+            table.add_row("...", "", f"{len(running) - max_rows} more")
+        return table
+
+
+def print_job_failure(job: Job) -> None:
+    """Print the failure of the job with the captured output"""
+    err_console.print(f" [red bold]FAIL[/] {job.name} {job.exception}")
+    for line in job.output.lines:
+        err_console.print(f"   [info]{escape(line)}[/]", highlight=False)
+    if job.output.log_path is not None and job.output.log_path.exists():
+        err_console.print(f"   Full output: [primary]{job.output.log_path}[/]")
+
+
+async def run_jobs(
+    jobs: list[Job],
+    concurrency: int,
+    on_complete: Callable[[Job], None] | None = None,
+    log_dir: Path | None = None,
+    limits: Mapping[str, int] | None = None,
+) -> None:
+    """Run the jobs concurrently in a single thread.
+
+    A job starts after all of its required jobs succeed, and fails without
+    running if any of them fails. Ready jobs with higher priority go first.
+    If log_dir is given, the output of each job is written to a log file in it.
+    The limits bound the number of running jobs of each pool, in addition to
+    the total concurrency.
+    """
+    limits = limits or {}
+    if log_dir is not None:
+        for job in jobs:
+            filename = re.sub(r"[^\w.-]", "_", job.name)
+            job.output = OutputBuffer(log_dir / f"{filename}.log")
+    order = {job: i for i, job in enumerate(jobs)}
+    waiting = {job: set(job.requires) for job in jobs}
+    dependents: dict[Job, list[Job]] = {job: [] for job in jobs}
+    for job in jobs:
+        for required in job.requires:
+            dependents[required].append(job)
+    ready = [(-job.priority, order[job], job) for job in jobs if not job.requires]
+    heapq.heapify(ready)
+
+    def _complete(job: Job) -> None:
+        if on_complete is not None:
+            on_complete(job)
+        for dependent in dependents[job]:
+            deps = waiting.get(dependent)
+            if deps is None:
+                continue
+            if job.state == "failed":
+                del waiting[dependent]
+                dependent.fail(DependencyFailed(f"dependency {job.name} failed"))
+                _complete(dependent)
+                continue
+            deps.discard(job)
+            if not deps:
+                heapq.heappush(
+                    ready, (-dependent.priority, order[dependent], dependent)
+                )
+
+    running: dict[asyncio.Future, Job] = {}
+    pool_counts: dict[str, int] = defaultdict(int)
+    while ready or running:
+        blocked = []
+        while ready and len(running) < concurrency:
+            item = heapq.heappop(ready)
+            job = item[2]
+            if job.pool in limits and pool_counts[job.pool] >= limits[job.pool]:
+                blocked.append(item)
+                continue
+            del waiting[job]
+            pool_counts[job.pool] += 1
+            running[asyncio.ensure_future(job.run())] = job
+        for item in blocked:
+            heapq.heappush(ready, item)
+        if not running:
+            break
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            job = running.pop(future)
+            pool_counts[job.pool] -= 1
+            _complete(job)
+    for job in list(waiting):
+        job.fail(DependencyFailed("circular dependency between jobs"))
+        del waiting[job]
+        if on_complete is not None:
+            on_complete(job)
+
+
+def show_jobs(
+    jobs: list[Job],
+    concurrency: int,
+    title: str,
+    on_complete: Callable[[Job], None] | None = None,
+    log_dir: Path | None = None,
+    limits: Mapping[str, int] | None = None,
+) -> None:
+    """Run the jobs and show the live progress of them"""
+    with Live(
+        JobTable(jobs, title), console=err_console, refresh_per_second=8, transient=True
+    ):
+        asyncio.run(run_jobs(jobs, concurrency, on_complete, log_dir, limits))
+
+
+def run_job(job: Job) -> Any:
+    """Run a single job outside of :func:`run_jobs` and return its result.
+
+    If a command run by the job fails, the error and the captured output are
+    printed and the command is aborted.
+    """
+    asyncio.run(job.run())
+    if isinstance(job.exception, CommandError):
+        err_console.print(f"[danger]Error running command[/] {job.exception.cmd}. ")
+        for line in job.output.lines:
+            err_console.print(f"   [info]{escape(line)}[/]", highlight=False)
+        raise click.Abort() from None
+    if job.exception is not None:
+        raise job.exception
+    return job.result
+
+
+async def run_sync(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking function in the default thread pool executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+async def async_run_command(
+    cmd: list[str], cwd: str | None = None, env: dict[str, str] | None = None
+) -> None:
+    """Run command in subprocess without blocking the event loop.
+
+    The output is streamed to the status and output buffer of the current job,
+    split on both "\n" and "\r" so progress bars update the status.
+    """
+    job = current_job.get()
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        env=env,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    assert process.stdout is not None
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    pending = ""
+
+    def _write(line: str) -> None:
+        if job is None:
+            return
+        job.output.write(line)
+        if line.strip():
+            job.status = line.strip()
+
+    try:
+        # Read in chunks as lines may exceed the limit of StreamReader.readline()
+        while True:
+            chunk = await process.stdout.read(64 * 1024)
+            pending += decoder.decode(chunk, final=not chunk)
+            # A "\r" at the end may be followed by "\n" in the next chunk
+            carry = "\r" if chunk and pending.endswith("\r") else ""
+            *lines, pending = LINE_BREAK.split(pending[: len(pending) - len(carry)])
+            for line in lines:
+                _write(line)
+            while len(pending) >= MAX_LINE_LENGTH:
+                _write(pending[:MAX_LINE_LENGTH])
+                pending = pending[MAX_LINE_LENGTH:]
+            pending += carry
+            if not chunk:
+                break
+        if pending:
+            _write(pending)
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+        raise
+    finally:
+        returncode = await process.wait()
+    if returncode != 0:
+        raise CommandError(cmd, returncode)
+
+
 def get_preferred_python_version() -> str:
     """Get preferred python version"""
     major, minor = sys.version_info[:2]
@@ -65,19 +443,135 @@ def ensure_virtualenv(path: Path, python_version: str | None = None) -> None:
     cli_run(args, setup_logging=True)
 
 
-def pip_install(venv_path: Path, requirements: Iterable[str]) -> None:
-    """Install the given requirements into the venv"""
-    ensure_virtualenv(venv_path)
+def find_python(python_version: str) -> Path:
+    """Find the interpreter of the given Python version, in the same way
+    virtualenv does when creating venvs with it.
+    """
+    from virtualenv.discovery.builtin import get_interpreter
+
+    interpreter = get_interpreter(python_version, [])
+    if interpreter is None:
+        raise click.UsageError(f"Python {python_version} is not found")
+    return Path(interpreter.executable)
+
+
+def get_venv_python(venv_path: Path) -> Path:
+    """Get the path to the Python interpreter of the venv"""
     if os.name == "nt":
-        python = venv_path / "Scripts" / "python.exe"
-    else:
-        python = venv_path / "bin" / "python"
+        return venv_path / "Scripts" / "python.exe"
+    return venv_path / "bin" / "python"
+
+
+_template_lock = threading.Lock()
+
+
+def ensure_virtualenv_template(path: Path, python_version: str | None = None) -> Path:
+    """Ensure the template virtualenv to clone package venvs from exists.
+
+    The template is created in a temporary directory and moved into place,
+    so a half-created template is never used.
+    """
+    from virtualenv import cli_run
+
+    with _template_lock:
+        if path.exists():
+            return path
+        info(f"Creating virtualenv template: [primary]{path}[/]")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with TemporaryDirectory(dir=path.parent) as tempdir:
+            temp_path = os.path.join(tempdir, path.name)
+            # The paths in the template are rewritten when cloned, the prompt
+            # is made the same as the package venvs
+            args = [temp_path, "--prompt", ".venv"]
+            if python_version:
+                args = ["-p", python_version, *args]
+            cli_run(args, setup_logging=False)
+            Path(temp_path, TEMPLATE_PREFIX_FILE).write_text(temp_path)
+            os.replace(temp_path, path)
+    return path
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def clone_virtualenv(template: Path, path: Path) -> None:
+    """Clone the template virtualenv to the given path.
+
+    Files are hard linked if the filesystem supports it, otherwise copied.
+    It is safe since pip always replaces files instead of writing them in place.
+    The scripts and top-level files containing the template path are copied
+    with the path rewritten.
+    """
+    info(f"Cloning virtualenv: [primary]{path}[/]")
+    # The path where the template was created, which is embedded in the files
+    prefix = template.joinpath(TEMPLATE_PREFIX_FILE).read_text()
+    old_prefix, new_prefix = os.fsencode(prefix), os.fsencode(path)
+    scripts_dir = template / ("Scripts" if os.name == "nt" else "bin")
+    for root, dirs, files in os.walk(template):
+        target_root = os.path.join(path, os.path.relpath(root, template))
+        os.makedirs(target_root, exist_ok=True)
+        rewrite = root in (str(template), str(scripts_dir))
+        for name in dirs + files:
+            if name == TEMPLATE_PREFIX_FILE:
+                continue
+            src, dst = os.path.join(root, name), os.path.join(target_root, name)
+            if os.path.islink(src):
+                link = os.readlink(src)
+                if os.path.isabs(link) and is_relative_to(Path(link), Path(prefix)):
+                    link = os.path.join(path, os.path.relpath(link, prefix))
+                os.symlink(link, dst)
+                if name in dirs:
+                    # Do not descend into linked directories
+                    dirs.remove(name)
+                continue
+            if name in dirs:
+                continue
+            if rewrite:
+                with open(src, "rb") as f:
+                    content = f.read()
+                if old_prefix in content:
+                    with open(dst, "wb") as f:
+                        f.write(content.replace(old_prefix, new_prefix))
+                    shutil.copymode(src, dst)
+                    continue
+            _link_or_copy(src, dst)
+
+
+@contextmanager
+def requirements_file(requirements: Iterable[str]) -> Iterator[str]:
+    """Write the requirements to a temporary file and yield the file name"""
     with NamedTemporaryFile(
         "w", prefix="monas-", suffix="-reqs.txt", delete=False
     ) as temp:
         for req in requirements:
             temp.write(f"{req}\n")
-        temp.close()
+    try:
+        yield temp.name
+    finally:
+        os.unlink(temp.name)
+
+
+async def pip_install(
+    venv_path: Path,
+    requirements: Iterable[str],
+    no_deps: bool = False,
+    python_version: str | None = None,
+) -> None:
+    """Install the given requirements into the venv
+
+    Args:
+        venv_path: The path to the venv
+        requirements: The lines of the requirements file
+        no_deps: Don't install the dependencies of the requirements
+        python_version: The Python version to create the venv with if missing
+    """
+    await run_sync(ensure_virtualenv, venv_path, python_version)
+    python = get_venv_python(venv_path)
+    with requirements_file(requirements) as filename:
         args = [
             str(python),
             "-Im",
@@ -85,12 +579,200 @@ def pip_install(venv_path: Path, requirements: Iterable[str]) -> None:
             "install",
             "--upgrade",
             "-r",
-            temp.name,
+            filename,
         ]
+        if no_deps:
+            args.append("--no-deps")
+        await async_run_command(args, cwd=str(venv_path.parent))
+
+
+def build_wheelhouse(
+    wheelhouse: Path, requirements: Iterable[str], python: Path
+) -> None:
+    """Collect wheels of the requirements and all their dependencies
+    into the wheelhouse directory.
+
+    If the wheelhouse already satisfies the requirements, no network access
+    is made. Otherwise, the missing wheels are downloaded or built.
+
+    Args:
+        wheelhouse: The directory to collect the wheels into
+        requirements: The requirements to collect
+        python: The interpreter of the venvs the wheels are installed into,
+            which selects the compatible wheels
+    """
+    wheelhouse.mkdir(parents=True, exist_ok=True)
+    with requirements_file(requirements) as filename:
+        args = [
+            str(python),
+            "-Im",
+            "pip",
+            "wheel",
+            "--wheel-dir",
+            str(wheelhouse),
+            "--find-links",
+            str(wheelhouse),
+            "-r",
+            filename,
+        ]
+        offline = subprocess.run(
+            [*args, "--no-index"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        if offline.returncode != 0:
+            run_command(args, stdout=subprocess.DEVNULL)
+
+
+def get_install_stamp(
+    requirements: Iterable[str], package_paths: Iterable[Path]
+) -> str:
+    """Get a hash of the requirements and the metadata files of the packages.
+
+    The content of the files given by the constraint and requirement options,
+    and the distributions in the find-links directories, are hashed as well.
+    """
+    hasher = hashlib.sha256()
+    for req in requirements:
+        hasher.update(f"req:{req}\n".encode())
+        if req.startswith("-"):
+            _hash_option_files(hasher, req)
+    for path in package_paths:
+        hasher.update(f"pkg:{path.as_posix()}\n".encode())
+        for filename in PACKAGE_FILES:
+            try:
+                hasher.update(path.joinpath(filename).read_bytes())
+            except FileNotFoundError:
+                hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+def _hash_option_files(hasher: Any, line: str) -> None:
+    args = shlex.split(line)
+    if len(args) != 2:
+        return
+    option, value = args
+    path = Path(value)
+    if option in ("-c", "--constraint", "-r", "--requirement"):
         try:
-            run_command(args, cwd=str(venv_path.parent), stdout=subprocess.DEVNULL)
-        finally:
-            os.unlink(temp.name)
+            hasher.update(b"file:" + path.read_bytes())
+        except OSError:
+            hasher.update(b"file:\0")
+    elif option in ("-f", "--find-links") and path.is_dir():
+        for child in sorted(path.iterdir()):
+            # Not the mtime, as rebuilding the wheelhouse rewrites the same files
+            hasher.update(f"dist:{child.name}:{child.stat().st_size}\n".encode())
+
+
+def read_install_stamp(venv_path: Path) -> str | None:
+    """Read the install stamp saved in the venv"""
+    try:
+        return venv_path.joinpath(INSTALL_STAMP).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+
+
+def write_install_stamp(venv_path: Path, stamp: str) -> None:
+    """Save the install stamp into the venv"""
+    venv_path.mkdir(parents=True, exist_ok=True)
+    venv_path.joinpath(INSTALL_STAMP).write_text(stamp, encoding="utf-8")
+
+
+def get_site_packages(venv_path: Path) -> Path:
+    """Get the site-packages directory of the venv"""
+    if os.name == "nt":
+        return venv_path / "Lib" / "site-packages"
+    site_packages = next(venv_path.glob("lib/*/site-packages"), None)
+    if site_packages is None:
+        raise FileNotFoundError(f"No site-packages directory is found in {venv_path}")
+    return site_packages
+
+
+def _write_if_changed(path: Path, content: str) -> bool:
+    try:
+        if path.read_text(encoding="utf-8") == content:
+            return False
+    except FileNotFoundError:
+        pass
+    path.write_text(content, encoding="utf-8")
+    return True
+
+
+def link_package(
+    site_packages: Path, name: str, version: str, path: Path, requires: Iterable[str]
+) -> bool:
+    """Make the package at the path importable from the site-packages,
+    by writing a .pth file and a minimal .dist-info directory.
+
+    No entry points are installed. Return True if any file is changed.
+    """
+    normalized = canonicalize_name(name).replace("-", "_")
+    source = path / "src" if (path / "src").is_dir() else path
+    pth_file = site_packages / f"_monas_{normalized}.pth"
+    dist_info = site_packages / f"{normalized}-{version}.dist-info"
+    metadata = "".join(
+        [
+            "Metadata-Version: 2.1\n",
+            f"Name: {name}\n",
+            f"Version: {version}\n",
+            *(f"Requires-Dist: {req}\n" for req in requires),
+        ]
+    )
+    direct_url = json.dumps({"url": path.as_uri(), "dir_info": {"editable": True}})
+    files = {
+        "METADATA": metadata,
+        "INSTALLER": f"{PROJECT_NAME}\n",
+        "direct_url.json": direct_url,
+    }
+    record = "".join(
+        f"{p},,\n"
+        for p in [
+            pth_file.name,
+            *(f"{dist_info.name}/{filename}" for filename in [*files, "RECORD"]),
+        ]
+    )
+    files["RECORD"] = record
+    dist_info.mkdir(exist_ok=True)
+    changed = _write_if_changed(pth_file, f"{source}\n")
+    for filename, content in files.items():
+        changed = _write_if_changed(dist_info / filename, content) or changed
+    return changed
+
+
+def unlink_packages(site_packages: Path, keep: dict[str, str]) -> list[str]:
+    """Remove packages linked by monas from the site-packages, except for those
+    in the given mapping of canonical names to versions.
+
+    Return the names of the packages to keep that are installed
+    by other installers, which should be uninstalled before linking.
+    """
+    conflicts: list[str] = []
+    for dist_info in site_packages.glob("*.dist-info"):
+        name, _, version = dist_info.name[: -len(".dist-info")].partition("-")
+        name = canonicalize_name(name)
+        try:
+            installer = dist_info.joinpath("INSTALLER").read_text().strip()
+        except FileNotFoundError:
+            installer = ""
+        if installer != PROJECT_NAME:
+            if name in keep:
+                conflicts.append(name)
+            continue
+        if keep.get(name) == version:
+            continue
+        normalized = name.replace("-", "_")
+        if name not in keep:
+            site_packages.joinpath(f"_monas_{normalized}.pth").unlink(missing_ok=True)
+        shutil.rmtree(dist_info)
+    return conflicts
+
+
+async def pip_uninstall(venv_path: Path, names: Iterable[str]) -> None:
+    """Uninstall the given packages from the venv"""
+    python = get_venv_python(venv_path)
+    args = [str(python), "-Im", "pip", "uninstall", "--yes", *names]
+    await async_run_command(args, cwd=str(venv_path.parent))
 
 
 def is_relative_to(path: Path, parent: Path) -> bool:
@@ -100,3 +782,32 @@ def is_relative_to(path: Path, parent: Path) -> bool:
         return True
     except ValueError:
         return False
+
+
+class PathTrie(Generic[T]):
+    """A trie of paths by their components, to find the values of all paths
+    containing a given path in O(depth), regardless of the number of paths.
+    """
+
+    def __init__(self) -> None:
+        self._children: dict[str, PathTrie[T]] = {}
+        self._values: list[T] = []
+
+    def insert(self, path: Path, value: T) -> None:
+        """Add the value for the path"""
+        node = self
+        for part in path.parts:
+            node = node._children.setdefault(part, PathTrie())
+        node._values.append(value)
+
+    def find(self, path: Path) -> list[T]:
+        """Get the values of the path and its parents, outermost first"""
+        node = self
+        result = list(node._values)
+        for part in path.parts:
+            child = node._children.get(part)
+            if child is None:
+                break
+            node = child
+            result.extend(node._values)
+        return result
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
 from pathlib import Path
-from typing import NamedTuple
+from typing import IO, Iterable, Iterator, NamedTuple
 
 import git
 from git import Repo
@@ -27,14 +32,98 @@ def _parse_describe_result(result: str) -> DescribeResult:
     return DescribeResult(tag, int(distance), node.lstrip("g"), is_dirty)
 
 
+def _split_nul(stream: IO[bytes], chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """Read the NUL-terminated fields from the stream chunk by chunk"""
+    pending = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        *fields, pending = (pending + chunk).split(b"\0")
+        for field in fields:
+            yield os.fsdecode(field)
+    if pending:
+        yield os.fsdecode(pending)
+
+
+def _parse_name_status(fields: Iterator[str]) -> Iterator[str]:
+    """Get the paths from the output of `git diff --name-status -z`.
+
+    Renames and copies are followed by both the source and destination paths.
+    """
+    for status in fields:
+        yield next(fields)
+        if status[:1] in ("R", "C"):
+            yield next(fields)
+
+
 class Git:
     """The git repository wrapper"""
 
     def __init__(self, path: Path):
         try:
-            self.repo = Repo(path)
+            # The monorepo may live in a subdirectory of the repository
+            self.repo = Repo(path, search_parent_directories=True)
         except InvalidGitRepositoryError:
             self.repo = Repo.init(path)
+        # Guards the long-lived `git cat-file --batch-check` process
+        self._batch_lock = threading.Lock()
+
+    def close(self) -> None:
+        """Stop the long-lived git processes."""
+        self.repo.close()
+
+    def _object_header(self, rev: str) -> tuple[str, str] | None:
+        """Get the id and type of the object, or None if it doesn't exist.
+
+        The lookups share one `git cat-file --batch-check` process.
+        """
+        with self._batch_lock:
+            try:
+                oid, kind, _ = self.repo.git.get_object_header(rev)
+            except ValueError:
+                return None
+        # The header is read as bytes
+        return os.fsdecode(oid), os.fsdecode(kind)
+
+    def _read_packed_refs(self) -> dict[str, str]:
+        try:
+            content = Path(self.repo.common_dir, "packed-refs").read_text()
+        except OSError:
+            return {}
+        refs = {}
+        for line in content.splitlines():
+            if line and not line.startswith(("#", "^")):
+                oid, name = line.split(" ", 1)
+                refs[name] = oid
+        return refs
+
+    def read_ref(self, name: str) -> str | None:
+        """Read the object id of the ref from the git directory, following the
+        symbolic refs, without running git.
+
+        Args:
+            name: The full name of the ref, e.g. `HEAD` or `refs/tags/v1.0`
+
+        Returns:
+            The object id, or None if it can't be read directly, in which case
+            git should be asked instead
+        """
+        git_dir = Path(self.repo.git_dir)
+        common_dir = Path(self.repo.common_dir)
+        if common_dir.joinpath("reftable").exists():
+            # The refs aren't stored as files
+            return None
+        for _ in range(5):
+            path = (common_dir if name.startswith("refs/") else git_dir) / name
+            try:
+                content = path.read_text().strip()
+            except OSError:
+                return self._read_packed_refs().get(name)
+            if not content.startswith("ref:"):
+                return content or None
+            name = content[4:].strip()
+        return None
 
     def get_user_name(self) -> str:
         """Get the user's name."""
@@ -59,13 +148,135 @@ class Git:
             output = ""
         return _parse_describe_result(output)
 
-    def diff(self, ref: str) -> list[str]:
-        """Get the diff between the current commit and the given ref."""
-        return [
-            f.strip()
-            for f in self.repo.git.diff("--name-only", ref).splitlines()
-            if f.strip()
-        ]
+    def diff(self, ref: str) -> Iterator[str]:
+        """Iterate over the files changed between the working tree and the given
+        ref, relative to the repository root.
+
+        The output of git is parsed as it is produced, and both sides of a rename
+        are included.
+        """
+        args = ["git", "diff", "--name-status", "-z", "-M", ref, "--"]
+        # Not a pipe, which would block git once full while stdout is read
+        with tempfile.TemporaryFile() as stderr:
+            proc = subprocess.Popen(
+                args,
+                cwd=self.repo.working_dir,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+            )
+            assert proc.stdout is not None
+            try:
+                yield from _parse_name_status(_split_nul(proc.stdout))
+                if proc.wait() != 0:
+                    stderr.seek(0)
+                    raise git.GitCommandError(
+                        args, proc.returncode, os.fsdecode(stderr.read())
+                    )
+            finally:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+                proc.stdout.close()
+
+    def get_tags_fingerprint(self) -> str | None:
+        """Get a hash of all tags, read from the git directory.
+
+        Returns:
+            The hash, or None if the refs aren't stored as files
+        """
+        common_dir = Path(self.repo.common_dir)
+        if common_dir.joinpath("reftable").exists():
+            return None
+        hasher = hashlib.sha256()
+        tags_dir = common_dir / "refs" / "tags"
+        if tags_dir.is_dir():
+            for path in sorted(tags_dir.rglob("*")):
+                if path.is_file():
+                    name = path.relative_to(tags_dir).as_posix()
+                    hasher.update(f"tag:{name}:".encode() + path.read_bytes())
+        try:
+            hasher.update(common_dir.joinpath("packed-refs").read_bytes())
+        except OSError:
+            pass
+        return hasher.hexdigest()
+
+    def get_worktree_state(self) -> tuple[str, int]:
+        """Get a hash of the uncommitted changes of the tracked files.
+
+        It covers the status of the changed files and their stat data, the
+        index itself is left out as git rewrites it when refreshing.
+
+        Returns:
+            The hash and the latest mtime of the changed files in nanoseconds
+        """
+        output = self.repo.git.status(
+            "--porcelain", "-z", "--untracked-files=no", "--no-renames"
+        )
+        hasher = hashlib.sha256()
+        latest = 0
+        for entry in output.split("\0"):
+            if not entry:
+                continue
+            try:
+                stat = os.lstat(os.path.join(self.repo.working_dir, entry[3:]))
+            except OSError:
+                hasher.update(f"{entry}:missing\n".encode())
+                continue
+            hasher.update(f"{entry}:{stat.st_mtime_ns}:{stat.st_size}\n".encode())
+            latest = max(latest, stat.st_mtime_ns)
+        return hasher.hexdigest(), latest
+
+    def resolve_commit(self, ref: str) -> str:
+        """Get the commit id of the ref.
+
+        Raises:
+            ValueError: If the ref doesn't point to a commit
+        """
+        if ref == "HEAD":
+            oid = self.read_ref(ref)
+            if oid is not None:
+                return oid
+        header = self._object_header(f"{ref}^{{commit}}")
+        if header is None:
+            raise ValueError(f"{ref} is not a commit")
+        return header[0]
+
+    def merge_base(self, ref: str, other: str = "HEAD") -> str:
+        """Get the best common ancestor of the two refs."""
+        return self.repo.git.merge_base(ref, other)
+
+    def get_tree_ids(self, ref: str, paths: Iterable[str]) -> list[str | None]:
+        """Get the ids of the tree objects of the directories in the ref.
+
+        Args:
+            ref: The commit to look up the directories in
+            paths: The directories relative to the repository root, or an empty
+                string for the root
+
+        Returns:
+            The tree ids in the same order, None for the missing directories
+        """
+        result: list[str | None] = []
+        for path in paths:
+            header = self._object_header(f"{ref}:{path}")
+            result.append(header[0] if header and header[1] == "tree" else None)
+        return result
+
+    def get_relative_path(self, path: Path) -> str:
+        """Get the path relative to the repository root, in the form git uses,
+        which is an empty string for the root itself.
+        """
+        relative = path.absolute().relative_to(Path(self.repo.working_dir).absolute())
+        return "" if relative == Path() else relative.as_posix()
+
+    def list_files(self, path: Path) -> list[str]:
+        """List the tracked and untracked but not ignored files under the path,
+        relative to the repository root.
+        """
+        output = self.repo.git.ls_files(
+            "-z", "--cached", "--others", "--exclude-standard", "--", str(path)
+        )
+        return sorted({f for f in output.split("\0") if f})
 
     def commit(self, message: str) -> None:
         """Commit the changes."""
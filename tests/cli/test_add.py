@@ -5,7 +5,9 @@ import pytest
 
 @pytest.mark.parametrize("no_install", [True, False])
 @mock.patch("monas.project.pip_install")
-def test_add_dependency_to_all(pip_install, test_project, cli_run, no_install):
+def test_add_dependency_to_all(
+    pip_install, test_project, cli_run, no_install, python_version
+):
     cli_run(
         ["add", "click"] + (["--no-install"] if no_install else []), cwd=test_project
     )
@@ -29,14 +31,17 @@ def test_add_dependency_to_all(pip_install, test_project, cli_run, no_install):
                 mock.call(
                     test_project / "packages/foo/.venv",
                     ["-e {}".format((test_project / "packages/foo").as_posix())],
+                    python_version=python_version,
                 ),
                 mock.call(
                     test_project / "packages/bar/.venv",
                     ["-e {}".format((test_project / "packages/bar").as_posix())],
+                    python_version=python_version,
                 ),
                 mock.call(
                     test_project / "extras/foo-more/.venv",
                     ["-e {}".format((test_project / "extras/foo-more").as_posix())],
+                    python_version=python_version,
                 ),
             ],
             any_order=True,
@@ -44,7 +49,7 @@ def test_add_dependency_to_all(pip_install, test_project, cli_run, no_install):
 
 
 @mock.patch("monas.project.pip_install")
-def test_add_managed_package(pip_install, test_project, cli_run):
+def test_add_managed_package(pip_install, test_project, cli_run, python_version):
     cli_run(["add", "foo"], cwd=test_project)
     assert (
         'dependencies = [\n    "foo",\n]'
@@ -62,6 +67,7 @@ def test_add_managed_package(pip_install, test_project, cli_run):
                     "-e {}".format((test_project / "packages/foo").as_posix()),
                     "-e {}".format((test_project / "packages/bar").as_posix()),
                 ],
+                python_version=python_version,
             ),
             mock.call(
                 test_project / "extras/foo-more/.venv",
@@ -69,6 +75,7 @@ def test_add_managed_package(pip_install, test_project, cli_run):
                     "-e {}".format((test_project / "packages/foo").as_posix()),
                     "-e {}".format((test_project / "extras/foo-more").as_posix()),
                 ],
+                python_version=python_version,
             ),
         ],
         any_order=True,
@@ -77,11 +84,14 @@ def test_add_managed_package(pip_install, test_project, cli_run):
         pip_install.assert_called_with(
             test_project / "packages/foo/.venv",
             ["-e {}".format((test_project / "packages/foo").as_posix())],
+            python_version=python_version,
         )
 
 
 @mock.patch("monas.project.pip_install")
-def test_add_dependency_to_specific_packages(pip_install, test_project, cli_run):
+def test_add_dependency_to_specific_packages(
+    pip_install, test_project, cli_run, python_version
+):
     cli_run(["add", "click", "--include", "foo*"], cwd=test_project)
     assert (
         "install_requires = \n\tclick"
@@ -100,10 +110,12 @@ def test_add_dependency_to_specific_packages(pip_install, test_project, cli_run)
             mock.call(
                 test_project / "packages/foo/.venv",
                 ["-e {}".format((test_project / "packages/foo").as_posix())],
+                python_version=python_version,
             ),
             mock.call(
                 test_project / "extras/foo-more/.venv",
                 ["-e {}".format((test_project / "extras/foo-more").as_posix())],
+                python_version=python_version,
             ),
         ],
         any_order=True,
@@ -112,11 +124,14 @@ def test_add_dependency_to_specific_packages(pip_install, test_project, cli_run)
         pip_install.assert_called_with(
             test_project / "packages/bar/.venv",
             ["-e {}".format((test_project / "packages/bar").as_posix())],
+            python_version=python_version,
         )
 
 
 @mock.patch("monas.project.pip_install")
-def test_add_dependency_except_specific_packages(pip_install, test_project, cli_run):
+def test_add_dependency_except_specific_packages(
+    pip_install, test_project, cli_run, python_version
+):
     cli_run(["add", "click", "--exclude", "foo*"], cwd=test_project)
     assert (
         "install_requires = \n\tclick"
@@ -133,4 +148,5 @@ def test_add_dependency_except_specific_packages(pip_install, test_project, cli_
     pip_install.assert_called_once_with(
         test_project / "packages/bar/.venv",
         ["-e {}".format((test_project / "packages/bar").as_posix())],
+        python_version=python_version,
     )
@@ -1,3 +1,5 @@
+from unittest import mock
+
 from monas.utils import run_command
 
 
@@ -12,3 +14,92 @@ def test_show_changed_packages(test_project, cli_run):
     # Show changed packages
     result = cli_run(["changed"], cwd=test_project)
     assert result.output.strip() == "foo"
+
+
+def test_changed_packages_with_renames(test_project, cli_run):
+    cli_run(["bump", "minor"], cwd=test_project, input="\n")
+    test_project.joinpath("packages/foo/foo/new\nline.py").write_text("x = 1\n")
+    run_command(["git", "add", "."], cwd=str(test_project))
+    run_command(["git", "commit", "-m", "Add a file"], cwd=str(test_project))
+    result = cli_run(["changed"], cwd=test_project)
+    assert result.output.strip() == "foo"
+
+    cli_run(["bump", "minor"], cwd=test_project, input="\n")
+    run_command(
+        ["git", "mv", "packages/foo/foo/new\nline.py", "packages/bar/bar/moved.py"],
+        cwd=str(test_project),
+    )
+    run_command(["git", "commit", "-m", "Move the file"], cwd=str(test_project))
+    result = cli_run(["changed"], cwd=test_project)
+    assert result.output.split() == ["bar", "foo"]
+
+
+def test_changed_packages_since_ref(test_project, cli_run):
+    def git(*args):
+        run_command(["git", *args], cwd=str(test_project))
+
+    def commit_file(path):
+        test_project.joinpath(path).write_text("x = 1\n")
+        git("add", path)
+        git("commit", "-m", f"Add {path}")
+
+    git("branch", "base")
+    git("checkout", "-b", "feature")
+    commit_file("packages/foo/foo/utils.py")
+    git("checkout", "base")
+    commit_file("packages/bar/bar/utils.py")
+    git("checkout", "feature")
+
+    result = cli_run(["changed", "--since", "base"], cwd=test_project)
+    assert result.output.split() == ["bar", "foo"]
+    result = cli_run(["changed", "--since", "base", "--merge-base"], cwd=test_project)
+    assert result.output.split() == ["foo"]
+    result = cli_run(["changed", "--since", "HEAD"], cwd=test_project)
+    assert result.output == ""
+    assert "No change since HEAD" in result.stderr
+
+    result = cli_run(["changed", "--since", "nonexist"], cwd=test_project)
+    assert result.exit_code != 0
+    assert "Unknown ref nonexist" in result.output
+
+
+def test_changed_packages_cached(test_project, cli_run):
+    cli_run(["bump", "minor"], cwd=test_project, input="\n")
+    test_project.joinpath("packages/foo/foo/utils.py").touch()
+    run_command(["git", "add", "packages/foo/foo/utils.py"], cwd=str(test_project))
+    run_command(["git", "commit", "-m", "Add utils.py"], cwd=str(test_project))
+    result = cli_run(["changed"], cwd=test_project)
+    assert result.output.strip() == "foo"
+
+    with mock.patch("monas.vcs.Git.describe_ref") as describe_ref:
+        result = cli_run(["changed"], cwd=test_project)
+    describe_ref.assert_not_called()
+    assert result.output.strip() == "foo"
+
+    # Uncommitted changes invalidate the cache
+    test_project.joinpath("packages/bar/pyproject.toml").open("a").write("\n")
+    result = cli_run(["changed"], cwd=test_project)
+    assert result.output.split() == ["bar", "foo"]
+
+
+def test_changed_packages_in_subdirectory(test_project, cli_run):
+    def git(*args):
+        run_command(["git", *args], cwd=str(test_project))
+
+    # Move the monorepo into a subdirectory of the git repository
+    mono = test_project / "mono"
+    mono.mkdir()
+    for path in list(test_project.iterdir()):
+        if path.name not in (".git", "mono"):
+            path.rename(mono / path.name)
+    git("add", "-A")
+    git("commit", "-m", "Move into a subdirectory")
+    git("tag", "-a", "-m", "v1", "v1")
+    mono.joinpath("packages/foo/foo/utils.py").write_text("x = 1\n")
+    git("add", ".")
+    git("commit", "-m", "Add utils.py")
+
+    result = cli_run(["changed", "--since", "v1"], cwd=mono)
+    assert result.output.split() == ["foo"]
+    result = cli_run(["changed"], cwd=mono)
+    assert result.output.split() == ["foo"]
@@ -0,0 +1,71 @@
+from unittest import mock
+
+import pytest
+from packaging.specifiers import SpecifierSet
+
+from monas.requirements import is_satisfiable
+
+
+@pytest.mark.parametrize(
+    "specifier,satisfiable",
+    [
+        (">1,<2", True),
+        ("~=1.4.5,>1.4.5", True),
+        ("==1.*,>=1.5", True),
+        (">=2.0b1,<2.1", True),
+        (">=2,<1", False),
+        ("==1.0,!=1.0", False),
+        (">=1,!=1.*,<2", False),
+        ("<1,>=1", False),
+    ],
+)
+def test_is_satisfiable(specifier, satisfiable):
+    assert is_satisfiable(SpecifierSet(specifier)) is satisfiable
+
+
+def test_check_conflicts(test_project, cli_run):
+    cli_run(["add", "click>=8", "--no-install", "--include", "foo"], cwd=test_project)
+    cli_run(["add", "click<8", "--no-install", "--include", "bar"], cwd=test_project)
+    result = cli_run(["check", "--conflicts"], cwd=test_project)
+    assert result.exit_code == 0
+
+    result = cli_run(["check", "--conflicts", "--root"], cwd=test_project)
+    assert result.exit_code == 1
+    assert "CONFLICT click" in result.stderr
+    assert "foo requires click>=8" in result.stderr
+    assert "bar requires click<8" in result.stderr
+
+    cli_run(["add", "foo", "--no-install", "--include", "bar"], cwd=test_project)
+    result = cli_run(["check"], cwd=test_project)
+    assert result.exit_code == 1
+    assert "Found 1 conflict(s)" in result.output
+
+
+def test_check_conflicts_with_markers(test_project, cli_run):
+    cli_run(
+        ["add", "click>=8; python_version < '3.0'", "--no-install", "--include", "foo"],
+        cwd=test_project,
+    )
+    cli_run(["add", "click<8", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(["add", "foo", "--no-install", "--include", "bar"], cwd=test_project)
+    result = cli_run(["check"], cwd=test_project)
+    assert result.exit_code == 0
+    result = cli_run(["check", "--python", "2.7"], cwd=test_project)
+    assert result.exit_code == 1
+    assert "CONFLICT click (python 2.7)" in result.stderr
+
+
+@mock.patch("monas.project.pip_install")
+def test_install_stops_on_conflicts(pip_install, test_project, cli_run):
+    cli_run(["add", "click>=8", "--no-install", "--include", "foo"], cwd=test_project)
+    cli_run(["add", "click<8", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(["add", "foo", "--no-install", "--include", "bar"], cwd=test_project)
+    result = cli_run(["install"], cwd=test_project)
+    assert result.exit_code == 1
+    assert "CONFLICT click" in result.stderr
+    pip_install.assert_not_called()
+
+    result = cli_run(["install", "--no-check"], cwd=test_project)
+    assert result.exit_code == 0
+    assert "CONFLICT" not in result.stderr
+    assert pip_install.call_count == 3
@@ -53,3 +53,11 @@ python-version = "3.9"
 
     assert os.path.exists(os.path.join(tmp_path, "packages1"))
     assert os.path.exists(os.path.join(tmp_path, "packages2"))
+
+
+def test_init_adds_monas_dir_to_existing_gitignore(cli_run, tmp_path):
+    tmp_path.joinpath(".gitignore").write_text("*.pyc")
+    cli_run(["init"], cwd=tmp_path)
+    assert tmp_path.joinpath(".gitignore").read_text() == "*.pyc\n.monas/\n"
+    cli_run(["init"], cwd=tmp_path)
+    assert tmp_path.joinpath(".gitignore").read_text() == "*.pyc\n.monas/\n"
@@ -1,23 +1,29 @@
+from pathlib import Path
 from unittest import mock
 
+from monas.utils import CommandError, current_job
+
 
 @mock.patch("monas.project.pip_install")
-def test_install_all_packages(pip_install, test_project, cli_run):
+def test_install_all_packages(pip_install, test_project, cli_run, python_version):
     cli_run(["add", "click", "--no-install"], cwd=test_project)
     cli_run(["install"], cwd=test_project)
     pip_install.assert_has_calls(
         [
             mock.call(
                 test_project / "packages/foo/.venv",
-                ["-e {}".format((test_project / "packages/foo").as_posix())],
+                [f"-e {(test_project / 'packages/foo').as_posix()}"],
+                python_version=python_version,
             ),
             mock.call(
                 test_project / "packages/bar/.venv",
-                ["-e {}".format((test_project / "packages/bar").as_posix())],
+                [f"-e {(test_project / 'packages/bar').as_posix()}"],
+                python_version=python_version,
             ),
             mock.call(
                 test_project / "extras/foo-more/.venv",
-                ["-e {}".format((test_project / "extras/foo-more").as_posix())],
+                [f"-e {(test_project / 'extras/foo-more').as_posix()}"],
+                python_version=python_version,
             ),
         ],
         any_order=True,
@@ -26,8 +32,168 @@ def test_install_all_packages(pip_install, test_project, cli_run):
 
 @mock.patch("monas.project.pip_install")
 @mock.patch("monas.commands.install.pip_install")
-def test_install_packages_to_root(root_install, package_install, test_project, cli_run):
+def test_install_packages_to_root(
+    root_install, package_install, test_project, cli_run, python_version
+):
     cli_run(["add", "click", "--no-install"], cwd=test_project)
     cli_run(["install", "--root"], cwd=test_project)
     package_install.assert_not_called()
-    root_install.assert_called_once_with(test_project / ".venv", mock.ANY)
+    root_install.assert_called_once_with(
+        test_project / ".venv", mock.ANY, python_version=python_version
+    )
+
+
+async def _fail_install(venv, requirements, **kwargs):
+    current_job.get().output.write("ERROR: No matching distribution found\n")
+    raise CommandError(["pip", "install"], 1)
+
+
+@mock.patch("monas.commands.install.pip_install", side_effect=_fail_install)
+def test_install_packages_to_root_failed(root_install, test_project, cli_run):
+    result = cli_run(["install", "--root"], cwd=test_project)
+    assert result.exit_code == 1
+    assert "Error running command ['pip', 'install']" in result.stderr
+    assert "ERROR: No matching distribution found" in result.stderr
+
+
+@mock.patch("monas.project.pip_install")
+def test_install_transitive_local_dependencies(
+    pip_install, test_project, cli_run, python_version
+):
+    cli_run(["add", "foo", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(["add", "bar", "--no-install", "--include", "foo-more"], cwd=test_project)
+    cli_run(["install", "--include", "foo-more"], cwd=test_project)
+    pip_install.assert_called_once_with(
+        test_project / "extras/foo-more/.venv",
+        [
+            f"-e {(test_project / 'packages/foo').as_posix()}",
+            f"-e {(test_project / 'packages/bar').as_posix()}",
+            f"-e {(test_project / 'extras/foo-more').as_posix()}",
+        ],
+        python_version=python_version,
+    )
+
+
+@mock.patch("monas.project.pip_install")
+def test_install_packages_in_dependency_order(pip_install, test_project, cli_run):
+    cli_run(["add", "foo", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(["add", "bar", "--no-install", "--include", "foo-more"], cwd=test_project)
+    cli_run(["install", "-c", "3"], cwd=test_project)
+    venvs = [c.args[0] for c in pip_install.call_args_list]
+    assert venvs == [
+        test_project / "packages/foo/.venv",
+        test_project / "packages/bar/.venv",
+        test_project / "extras/foo-more/.venv",
+    ]
+
+
+@mock.patch("monas.project.pip_install")
+def test_skip_dependents_of_failed_package(pip_install, test_project, cli_run):
+    cli_run(["add", "foo", "--no-install", "--include", "bar"], cwd=test_project)
+    pip_install.side_effect = lambda venv, reqs, **kwargs: 1 / (
+        venv.parent.name != "foo"
+    )
+    result = cli_run(["install"], cwd=test_project)
+    assert "FAIL foo" in result.stderr
+    assert "FAIL bar dependency foo failed" in result.stderr
+    assert "SUCC foo-more" in result.stderr
+    assert pip_install.call_count == 2
+
+
+@mock.patch("monas.project.pip_install")
+def test_skip_up_to_date_packages(pip_install, test_project, cli_run, python_version):
+    cli_run(["install"], cwd=test_project)
+    assert pip_install.call_count == 3
+    result = cli_run(["install"], cwd=test_project)
+    assert pip_install.call_count == 3
+    assert "SKIP foo is up to date" in result.stderr
+    cli_run(["add", "click", "--no-install", "--include", "foo"], cwd=test_project)
+    cli_run(["install"], cwd=test_project)
+    assert pip_install.call_count == 4
+    pip_install.assert_called_with(
+        test_project / "packages/foo/.venv",
+        [f"-e {(test_project / 'packages/foo').as_posix()}"],
+        python_version=python_version,
+    )
+    cli_run(["install", "--force"], cwd=test_project)
+    assert pip_install.call_count == 7
+
+
+@mock.patch("monas.config.Config.get_python", return_value=Path("/venv/bin/python"))
+@mock.patch("monas.commands.install.build_wheelhouse")
+@mock.patch("monas.project.pip_install")
+def test_install_from_wheelhouse(
+    pip_install, build_wheelhouse, get_python, test_project, cli_run, python_version
+):
+    cli_run(["add", "click>=7", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(["add", "foo", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(["install", "--include", "bar", "--wheelhouse", "wh"], cwd=test_project)
+    wheelhouse = test_project / "wh"
+    build_wheelhouse.assert_called_once_with(
+        wheelhouse,
+        ["click>=7", "pdm-backend", "setuptools>=61", "wheel"],
+        Path("/venv/bin/python"),
+    )
+    pip_install.assert_called_once_with(
+        test_project / "packages/bar/.venv",
+        [
+            "--no-index",
+            f"--find-links {wheelhouse.as_posix()}",
+            f"-e {(test_project / 'packages/foo').as_posix()}",
+            f"-e {(test_project / 'packages/bar').as_posix()}",
+        ],
+        python_version=python_version,
+    )
+
+
+def _create_venv(venv_path, *args, **kwargs):
+    venv_path.joinpath("lib/python3/site-packages").mkdir(parents=True, exist_ok=True)
+
+
+@mock.patch("monas.project.ensure_virtualenv", side_effect=_create_venv)
+@mock.patch("monas.project.pip_install", side_effect=_create_venv)
+def test_install_with_link(
+    pip_install, ensure_virtualenv, test_project, cli_run, python_version
+):
+    cli_run(["add", "click", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(["add", "foo", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(["install", "--link", "--include", "bar"], cwd=test_project)
+    venv_path = test_project / "packages/bar/.venv"
+    pip_install.assert_called_once_with(
+        venv_path, ["click"], python_version=python_version
+    )
+    site_packages = venv_path / "lib/python3/site-packages"
+    pth = site_packages.joinpath("_monas_foo.pth").read_text()
+    assert pth == f"{test_project / 'packages/foo'}\n"
+    metadata = site_packages.joinpath("bar-0.0.0.dist-info/METADATA").read_text()
+    assert "Name: bar\nVersion: 0.0.0\n" in metadata
+    assert "Requires-Dist: click\nRequires-Dist: foo\n" in metadata
+
+    cli_run(["remove", "foo", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(["add", "foo-more", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(["install", "--link", "--include", "bar"], cwd=test_project)
+    assert pip_install.call_count == 1
+    assert site_packages.joinpath("_monas_foo_more.pth").exists()
+    assert not site_packages.joinpath("_monas_foo.pth").exists()
+    assert not site_packages.joinpath("foo-0.0.0.dist-info").exists()
+
+
+@mock.patch("monas.project.pip_install")
+def test_install_with_constraints(pip_install, test_project, cli_run, python_version):
+    cli_run(["add", "click>=7", "--no-install", "--include", "foo"], cwd=test_project)
+    cli_run(["add", "click<9", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(
+        ["add", "requests[socks]", "--no-install", "--include", "bar"],
+        cwd=test_project,
+    )
+    cli_run(["install", "--constraints", "--include", "foo"], cwd=test_project)
+    constraints = test_project / ".monas/constraints.txt"
+    assert constraints.read_text() == "click<9,>=7\n"
+    pip_install.assert_called_once_with(
+        test_project / "packages/foo/.venv",
+        [
+            f"-c {constraints.as_posix()}",
+            f"-e {(test_project / 'packages/foo').as_posix()}",
+        ],
+        python_version=python_version,
+    )
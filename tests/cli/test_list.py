@@ -1,4 +1,5 @@
 import json
+from unittest import mock
 
 import pytest
 
@@ -43,3 +44,33 @@ def test_list_packages_long_output(test_project, cli_run):
         ["foo", "0.0.0", "packages/foo"],
         ["foo-more", "0.0.0", "extras/foo-more"],
     ]
+
+
+def test_list_packages_from_index(test_project, cli_run):
+    cli_run(["list"], cwd=test_project)
+    assert test_project.joinpath(".monas/index.json").exists()
+    with mock.patch("monas.project.get_metadata", side_effect=AssertionError):
+        result = cli_run(["list", "--long"], cwd=test_project)
+    assert sorted(line.split()[0] for line in result.output.splitlines()) == [
+        "bar",
+        "foo",
+        "foo-more",
+    ]
+
+
+def test_index_is_invalidated_by_metadata_change(test_project, cli_run):
+    cli_run(["list"], cwd=test_project)
+    cli_run(["add", "click", "--no-install", "--include", "bar"], cwd=test_project)
+    pyproject = test_project / "packages/bar/pyproject.toml"
+    pyproject.write_text(pyproject.read_text().replace('"0.0.0"', '"1.0.0"'))
+    result = cli_run(["list", "--json"], cwd=test_project)
+    versions = {pkg["name"]: pkg["version"] for pkg in json.loads(result.output)}
+    assert versions == {"bar": "1.0.0", "foo": "0.0.0", "foo-more": "0.0.0"}
+
+
+@mock.patch("monas.config.PARALLEL_THRESHOLD", 0)
+def test_list_packages_in_parallel(test_project, cli_run):
+    test_project.joinpath(".monas/index.json").unlink(missing_ok=True)
+    result = cli_run(["list", "-c", "2"], cwd=test_project)
+    output_packages = sorted(line.strip() for line in result.output.splitlines())
+    assert output_packages == ["bar", "foo", "foo-more"]
@@ -0,0 +1,149 @@
+from pathlib import Path
+from unittest import mock
+
+from monas.lock import Lockfile
+from monas.utils import find_python, get_preferred_python_version
+
+REPORT = {
+    "environment": {"python_version": "3.11", "sys_platform": "linux"},
+    "install": [
+        {
+            "download_info": {
+                "url": "https://example.org/click-8.1.0-py3-none-any.whl",
+                "archive_info": {"hashes": {"sha256": "c1"}},
+            },
+            "metadata": {
+                "name": "click",
+                "version": "8.1.0",
+                "requires_dist": ['colorama; platform_system == "Windows"'],
+            },
+        },
+        {
+            "download_info": {
+                "url": "https://example.org/requests-2.31.0-py3-none-any.whl",
+                "archive_info": {"hashes": {"sha256": "r1"}},
+            },
+            "metadata": {
+                "name": "requests",
+                "version": "2.31.0",
+                "requires_dist": ["idna", 'PySocks; extra == "socks"'],
+                "provides_extra": ["socks"],
+            },
+        },
+        {
+            "download_info": {
+                "url": "https://example.org/idna-3.4-py3-none-any.whl",
+                "archive_info": {"hashes": {"sha256": "i1"}},
+            },
+            "metadata": {"name": "idna", "version": "3.4"},
+        },
+    ],
+}
+
+
+@mock.patch("monas.config.Config.get_python", return_value=Path("/venv/bin/python"))
+@mock.patch("monas.commands.lock.resolve_requirements", return_value=REPORT)
+@mock.patch("monas.project.pip_install")
+def test_lock_and_install_frozen(
+    pip_install, resolve, get_python, test_project, cli_run, python_version
+):
+    cli_run(["add", "click>=8", "--no-install", "--include", "foo"], cwd=test_project)
+    cli_run(["add", "requests", "--no-install", "--include", "bar"], cwd=test_project)
+    cli_run(["add", "foo", "--no-install", "--include", "bar"], cwd=test_project)
+    result = cli_run(["lock"], cwd=test_project)
+    assert "Locked 3 package(s)" in result.stderr
+    resolve.assert_called_once_with(["click>=8", "requests"], Path("/venv/bin/python"))
+    assert test_project.joinpath("monas.lock").exists()
+
+    cli_run(["install", "--frozen", "--include", "bar"], cwd=test_project)
+    venv_path = test_project / "packages/bar/.venv"
+    pip_install.assert_has_calls(
+        [
+            mock.call(
+                venv_path,
+                [
+                    "click==8.1.0 --hash=sha256:c1",
+                    "idna==3.4 --hash=sha256:i1",
+                    "requests==2.31.0 --hash=sha256:r1",
+                ],
+                no_deps=True,
+                python_version=python_version,
+            ),
+            mock.call(
+                venv_path,
+                [
+                    "-e {}".format((test_project / "packages/foo").as_posix()),
+                    "-e {}".format((test_project / "packages/bar").as_posix()),
+                ],
+                no_deps=True,
+                python_version=python_version,
+            ),
+        ]
+    )
+
+
+@mock.patch("monas.config.Config.get_python", return_value=Path("/venv/bin/python"))
+@mock.patch("monas.commands.lock.resolve_requirements", return_value=REPORT)
+@mock.patch("monas.project.pip_install")
+def test_install_frozen_with_outdated_lock(
+    pip_install, resolve, get_python, test_project, cli_run
+):
+    result = cli_run(["install", "--frozen"], cwd=test_project)
+    assert result.exit_code != 0
+    assert "monas.lock is not found" in result.output
+    cli_run(["add", "click", "--no-install", "--include", "foo"], cwd=test_project)
+    cli_run(["lock"], cwd=test_project)
+    cli_run(["add", "idna", "--no-install", "--include", "foo"], cwd=test_project)
+    result = cli_run(["install", "--frozen"], cwd=test_project)
+    assert result.exit_code != 0
+    assert "monas.lock is outdated" in result.output
+    pip_install.assert_not_called()
+
+
+@mock.patch("monas.config.Config.get_python", return_value=Path("/venv/bin/python"))
+@mock.patch("monas.commands.lock.resolve_requirements", return_value={"install": []})
+@mock.patch("monas.commands.install.pip_install")
+def test_install_frozen_to_root_with_incomplete_lock(
+    pip_install, resolve, get_python, test_project, cli_run
+):
+    cli_run(["add", "click", "--no-install", "--include", "foo"], cwd=test_project)
+    cli_run(["lock"], cwd=test_project)
+    result = cli_run(["install", "--frozen", "--root"], cwd=test_project)
+    assert result.exit_code != 0
+    assert "click is not found in the lock file" in result.output
+    pip_install.assert_not_called()
+
+
+@mock.patch("monas.commands.lock.resolve_requirements", return_value=REPORT)
+def test_lock_without_clone_venvs_uses_system_python(resolve, test_project, cli_run):
+    cli_run(["add", "click", "--no-install", "--include", "foo"], cwd=test_project)
+    cli_run(["lock"], cwd=test_project)
+    python = resolve.call_args.args[1]
+    assert python == find_python(get_preferred_python_version())
+    assert not test_project.joinpath(".monas/venv-templates").exists()
+
+
+def test_lock_markers_and_vcs_urls():
+    report = {
+        "environment": {"python_version": "3.8", "sys_platform": "linux"},
+        "install": [
+            *REPORT["install"],
+            {
+                "is_direct": True,
+                "download_info": {
+                    "url": "https://github.com/example/mylib.git",
+                    "vcs_info": {"vcs": "git", "commit_id": "abc123"},
+                    "subdirectory": "lib",
+                },
+                "metadata": {"name": "mylib", "version": "1.0"},
+            },
+        ],
+    }
+    lock = Lockfile.from_report([], report)
+    # Evaluated with the locked environment, not the running interpreter
+    assert lock.get_requirements(
+        ['click; python_version >= "3.10"', 'idna; python_version < "3.9"', "mylib"]
+    ) == [
+        "idna==3.4",
+        "mylib @ git+https://github.com/example/mylib.git@abc123#subdirectory=lib",
+    ]
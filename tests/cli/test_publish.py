@@ -1,18 +1,174 @@
-import sys
+import threading
+import zipfile
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest import mock
 
+import pytest
 
-@mock.patch("monas.commands.publish.build_package")
-@mock.patch("monas.commands.publish.run_command")
-def test_publish(run_command, build_package, test_project, cli_run):
-    cli_run(["publish"], cwd=test_project, input="\n")
-    assert build_package.call_count == 3
-    twine_args = [
-        sys.executable,
-        "-m",
-        "twine",
-        "upload",
-        "--non-interactive",
-        "dist/*",
+from monas.builder import BuildResult
+from monas.uploader import UploadState
+
+
+class IndexHandler(BaseHTTPRequestHandler):
+    """A stand-in for the upload API of a package index"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        message = BytesParser().parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+        )
+        fields = {}
+        for part in message.get_payload():
+            name = part.get_param("name", header="content-disposition")
+            fields[name] = part.get_filename() or part.get_payload(decode=True)
+        if fields["name"].decode() in self.server.failing:
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        upload = (
+            fields["name"].decode(),
+            fields["version"].decode(),
+            fields["content"],
+        )
+        if upload in self.server.existing:
+            self.send_response(400, "File already exists")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.server.existing.add(upload)
+        self.server.uploads.append(upload)
+        self.server.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def index_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), IndexHandler)
+    server.uploads = []
+    server.connections = set()
+    server.failing = set()
+    server.existing = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_wheel(outdir, name, version):
+    dist_info = f"{name.replace('-', '_')}-{version}.dist-info"
+    path = outdir / f"{name.replace('-', '_')}-{version}-py3-none-any.whl"
+    files = {
+        "METADATA": f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n",
+        "WHEEL": "Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\n"
+        "Tag: py3-none-any\n",
+        "RECORD": "",
+    }
+    with zipfile.ZipFile(path, "w") as zf:
+        for filename, content in files.items():
+            # A fixed timestamp so that the rebuilt wheels are identical
+            zf.writestr(zipfile.ZipInfo(f"{dist_info}/{filename}"), content)
+    return path
+
+
+async def fake_build(package, outdir, sdist=True):
+    return BuildResult([make_wheel(outdir, package.name, package.version)], False)
+
+
+def run_publish(cli_run, project, server, *args):
+    url = f"http://127.0.0.1:{server.server_address[1]}/legacy/"
+    return cli_run(
+        ["publish", "-r", url, "-u", "user", "-p", "secret", *args],
+        cwd=project,
+        input="\n",
+    )
+
+
+@mock.patch("monas.builder.Builder.build", side_effect=fake_build)
+def test_publish(build, test_project, cli_run, index_server):
+    result = run_publish(
+        cli_run, test_project, index_server, "--upload-concurrency", "1"
+    )
+    assert build.call_count == 3
+    assert sorted(index_server.uploads) == [
+        ("bar", "0.0.0", "bar-0.0.0-py3-none-any.whl"),
+        ("foo", "0.0.0", "foo-0.0.0-py3-none-any.whl"),
+        ("foo-more", "0.0.0", "foo_more-0.0.0-py3-none-any.whl"),
     ]
-    run_command.assert_called_once_with(twine_args, cwd=str(test_project))
+    # The uploads share one keep-alive connection
+    assert len(index_server.connections) == 1
+    assert "UPLOADED foo-0.0.0-py3-none-any.whl" in result.stderr
+    assert "Publish done" in result.stderr
+
+
+@mock.patch("monas.builder.Builder.build", side_effect=fake_build)
+def test_publish_resume_uploads(build, test_project, cli_run, index_server):
+    index_server.failing.add("bar")
+    result = run_publish(cli_run, test_project, index_server)
+    assert result.exit_code == 1
+    assert sorted(name for name, *_ in index_server.uploads) == ["foo", "foo-more"]
+
+    index_server.failing.clear()
+    index_server.uploads.clear()
+    result = run_publish(cli_run, test_project, index_server)
+    assert result.exit_code == 0
+    assert index_server.uploads == [("bar", "0.0.0", "bar-0.0.0-py3-none-any.whl")]
+    assert "UPLOADED bar-0.0.0-py3-none-any.whl" in result.stderr
+    assert "UPLOADED foo-0.0.0-py3-none-any.whl" not in result.stderr
+
+
+@mock.patch("monas.builder.Builder.build", side_effect=fake_build)
+def test_publish_skip_published_versions(
+    build, test_project, cli_run, index_server, tmp_path
+):
+    index = tmp_path / "index"
+    index.joinpath("foo").mkdir(parents=True)
+    index.joinpath("foo", "foo-0.0.0.tar.gz").touch()
+    index.joinpath("foo", "foo-0.1.0-py3-none-any.whl").touch()
+    result = run_publish(cli_run, test_project, index_server, "--index-url", str(index))
+    assert result.exit_code == 0
+    assert build.call_count == 2
+    assert "SKIP foo 0.0.0 already exists on the index" in result.stderr
+    assert sorted(name for name, *_ in index_server.uploads) == ["bar", "foo-more"]
+
+
+@mock.patch("monas.builder.Builder.build", side_effect=fake_build)
+def test_publish_index_unavailable(build, test_project, cli_run, index_server):
+    # The stand-in index doesn't serve the simple API
+    index_url = f"http://127.0.0.1:{index_server.server_address[1]}/simple/"
+    result = run_publish(cli_run, test_project, index_server, "--index-url", index_url)
+    assert result.exit_code == 0
+    assert "Can't check if foo 0.0.0 is published" in result.stderr
+    assert build.call_count == 3
+
+
+@mock.patch("monas.builder.Builder.build", side_effect=fake_build)
+def test_publish_resume_after_interrupted_upload(
+    build, test_project, cli_run, index_server
+):
+    original_add = UploadState.add
+
+    def interrupted_add(self, repository_url, path, digest):
+        if path.name.startswith("bar"):
+            raise OSError("interrupted")
+        original_add(self, repository_url, path, digest)
+
+    with mock.patch.object(UploadState, "add", interrupted_add):
+        result = run_publish(cli_run, test_project, index_server)
+    assert result.exit_code == 1
+    assert len(index_server.uploads) == 3
+
+    index_server.uploads.clear()
+    result = run_publish(cli_run, test_project, index_server)
+    assert result.exit_code == 0
+    assert index_server.uploads == []
+    assert "Publish done" in result.stderr
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+
+from monas.builder import LAST_USED_FILE, Builder, BuildError, WorkerPool
+from monas.config import Config
+from monas.project import PyPackage
+from monas.requirements import get_build_system
+from monas.utils import ensure_virtualenv
+
+BACKEND = """\
+import os
+import sys
+
+
+def build_wheel(wheel_directory, config_settings=None, metadata_directory=None):
+    print("building", os.path.basename(os.getcwd()))
+    basename = f"{os.path.basename(os.getcwd())}-0.1.0-py3-none-any.whl"
+    with open(os.path.join(wheel_directory, basename), "w") as f:
+        f.write(str(os.getpid()))
+    return basename
+
+
+def build_sdist(sdist_directory, config_settings=None):
+    print("broken", file=sys.stderr)
+    raise RuntimeError("sdist is broken")
+"""
+
+
+@pytest.fixture()
+def in_tree_packages(tmp_path):
+    backend_dir = tmp_path / "backend"
+    backend_dir.mkdir()
+    backend_dir.joinpath("in_tree_backend.py").write_text(BACKEND)
+    paths = []
+    for name in ("first", "second"):
+        path = tmp_path / name
+        path.mkdir()
+        path.joinpath("pyproject.toml").write_text(
+            textwrap.dedent(
+                """\
+                [build-system]
+                requires = []
+                build-backend = "in_tree_backend"
+                backend-path = ["../backend"]
+                """
+            )
+        )
+        paths.append(path)
+    return paths
+
+
+class FakeJob:
+    def __init__(self):
+        self.status = ""
+        self.output = self
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line.rstrip("\n"))
+
+
+def _build(pool, path, outdir, job, hook="build_wheel", **kwargs):
+    build_system = get_build_system(path)
+    with pool.acquire(Path(sys.executable), build_system, path) as worker:
+        return worker.call(hook, path, job, config_settings=None, **kwargs)
+
+
+def test_worker_pool_reuses_workers_per_package(in_tree_packages, tmp_path):
+    pool = WorkerPool(1)
+    job = FakeJob()
+    first, second = in_tree_packages
+    try:
+        names = []
+        for path in (first, first, second):
+            outdir = tmp_path / f"out{len(names)}"
+            outdir.mkdir()
+            name = _build(pool, path, tmp_path, job, wheel_directory=str(outdir))
+            names.append(outdir / name)
+        pool.retire(second)
+        assert pool._count == 0
+    finally:
+        pool.close()
+    assert [path.name for path in names] == [
+        "first-0.1.0-py3-none-any.whl",
+        "first-0.1.0-py3-none-any.whl",
+        "second-0.1.0-py3-none-any.whl",
+    ]
+    pids = [path.read_text() for path in names]
+    assert pids[0] == pids[1] != pids[2]
+    assert job.lines == ["building first", "building first", "building second"]
+
+
+def test_worker_hook_failure(in_tree_packages, tmp_path):
+    pool = WorkerPool(1)
+    job = FakeJob()
+    try:
+        with pytest.raises(BuildError, match="build_sdist"):
+            _build(
+                pool,
+                in_tree_packages[0],
+                tmp_path,
+                job,
+                hook="build_sdist",
+                sdist_directory=str(tmp_path),
+            )
+    finally:
+        pool.close()
+    assert "broken" in job.lines
+    assert "RuntimeError: sdist is broken" in job.lines
+
+
+def test_build_envs_keyed_by_requires(project, monkeypatch):
+    monkeypatch.chdir(project)
+    builder = Builder(Config(), 1)
+    env = builder.get_build_env(["hatchling", "wheel"])
+    assert env.parent == project / ".monas/build-envs"
+    assert env == builder.get_build_env(["wheel ", "hatchling", "wheel"])
+    assert env != builder.get_build_env(["hatchling"])
+
+
+def test_evict_stale_build_envs(project, monkeypatch):
+    monkeypatch.chdir(project)
+    builder = Builder(Config(), 1)
+    fresh = builder.build_envs / "fresh"
+    stale = builder.build_envs / "stale"
+    for env_path in (fresh, stale):
+        env_path.mkdir(parents=True)
+        env_path.joinpath(LAST_USED_FILE).touch()
+    old = time.time() - builder.max_age - 60
+    os.utime(stale / LAST_USED_FILE, (old, old))
+    with builder:
+        pass
+    assert fresh.exists()
+    assert not stale.exists()
+
+
+def test_build_reuses_cached_artifacts(in_tree_packages, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tmp_path.joinpath("pyproject.toml").write_text("[tool.monas]\npackages = []\n")
+    path = in_tree_packages[0]
+    with path.joinpath("pyproject.toml").open("a") as f:
+        f.write('[project]\nname = "first"\nversion = "0.1.0"\n')
+    outdir = tmp_path / "dist"
+    outdir.mkdir()
+    config = Config()
+    package = PyPackage(config, path)
+    with Builder(config, 1) as builder:
+        result = asyncio.run(builder.build(package, outdir))
+        assert not result.cached
+        assert result.artifacts == [outdir / "first-0.1.0-py3-none-any.whl"]
+        pid = result.artifacts[0].read_text()
+
+        result.artifacts[0].unlink()
+        result = asyncio.run(builder.build(package, outdir))
+        assert result.cached
+        assert result.artifacts[0].read_text() == pid
+
+        path.joinpath("first.py").write_text("changed = True\n")
+        result = asyncio.run(builder.build(package, outdir))
+        assert not result.cached
+
+
+def test_build_in_env_with_dynamic_requires(in_tree_packages, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tmp_path.joinpath("pyproject.toml").write_text("[tool.monas]\npackages = []\n")
+    with tmp_path.joinpath("backend/in_tree_backend.py").open("a") as f:
+        f.write(
+            "\n\ndef get_requires_for_build_wheel(config_settings=None):\n"
+            "    return ['dynamic']\n"
+        )
+    installed = []
+
+    async def fake_pip_install(env_path, requirements):
+        ensure_virtualenv(env_path)
+        installed.append((env_path, requirements))
+
+    monkeypatch.setattr("monas.builder.pip_install", fake_pip_install)
+    outdir = tmp_path / "dist"
+    outdir.mkdir()
+    config = Config()
+    with Builder(config, 1) as builder:
+        for path in in_tree_packages:
+            asyncio.run(builder.build(PyPackage(config, path), outdir))
+    dynamic_env = builder.get_build_env(["dynamic"])
+    assert installed == [(dynamic_env, ["dynamic"])]
+    assert sorted(path.name for path in outdir.iterdir()) == [
+        "first-0.1.0-py3-none-any.whl",
+        "second-0.1.0-py3-none-any.whl",
+    ]
+    assert builder.get_build_env([]).exists()
+
+
+def test_source_hash_ignores_build_outputs(test_project, monkeypatch):
+    monkeypatch.chdir(test_project)
+    config = Config()
+    package = config.get_graph().packages["foo"]
+    build_system = get_build_system(package.path)
+    builder = Builder(config, 1)
+    source_hash = builder.get_source_hash(package, build_system)
+    for name in ("build/lib/foo.py", "foo.egg-info/PKG-INFO", "dist/foo.whl"):
+        package.path.joinpath(name).parent.mkdir(parents=True, exist_ok=True)
+        package.path.joinpath(name).write_text("output")
+    assert builder.get_source_hash(package, build_system) == source_hash
+    package.path.joinpath("new.py").write_text("")
+    assert builder.get_source_hash(package, build_system) != source_hash
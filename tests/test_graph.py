@@ -0,0 +1,29 @@
+from unittest import mock
+
+from monas.graph import WorkspaceGraph
+
+
+def make_package(name, dependencies):
+    return mock.Mock(
+        canonical_name=name,
+        get_dependency_names=mock.Mock(return_value=dependencies),
+    )
+
+
+def test_local_dependencies_with_cycle():
+    graph = WorkspaceGraph(
+        [
+            make_package("a", ["b"]),
+            make_package("b", ["a", "c"]),
+            make_package("c", []),
+            make_package("d", ["b"]),
+        ]
+    )
+
+    def names(name):
+        return sorted(pkg.canonical_name for pkg in graph.get_local_dependencies(name))
+
+    assert names("d") == ["a", "b", "c"]
+    assert names("a") == ["b", "c"]
+    assert names("b") == ["a", "c"]
+    assert names("c") == []
@@ -1,6 +1,22 @@
+import asyncio
+import os
+import sys
+
 import pytest
 
 from monas.commands.bump import bump_version
+from monas.utils import (
+    TEMPLATE_PREFIX_FILE,
+    CommandError,
+    DependencyFailed,
+    Job,
+    PathTrie,
+    async_run_command,
+    clone_virtualenv,
+    get_install_stamp,
+    get_site_packages,
+    run_jobs,
+)
 
 
 @pytest.mark.parametrize(
@@ -24,3 +40,188 @@ from monas.commands.bump import bump_version
 )
 def test_bump_version(original, part, tag, expected):
     assert bump_version(original, part, tag) == expected
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Cloning venvs is POSIX only")
+def test_clone_virtualenv(tmp_path):
+    template = tmp_path / "template"
+    prefix = tmp_path / "tmpxxx/template"
+    bin_dir = template / "bin"
+    site_packages = template / "lib/python3/site-packages"
+    bin_dir.mkdir(parents=True)
+    site_packages.mkdir(parents=True)
+    template.joinpath(TEMPLATE_PREFIX_FILE).write_text(str(prefix))
+    bin_dir.joinpath("pip").write_text(f"#!{prefix}/bin/python\nimport pip\n")
+    bin_dir.joinpath("pip").chmod(0o755)
+    bin_dir.joinpath("python").symlink_to(sys.executable)
+    bin_dir.joinpath("python3").symlink_to("python")
+    site_packages.joinpath("lib.py").write_text(f"PATH = {str(prefix)!r}\n")
+
+    target = tmp_path / "package/.venv"
+    clone_virtualenv(template, target)
+
+    assert (
+        target.joinpath("bin/pip").read_text() == f"#!{target}/bin/python\nimport pip\n"
+    )
+    assert os.access(target / "bin/pip", os.X_OK)
+    assert os.readlink(target / "bin/python") == sys.executable
+    assert os.readlink(target / "bin/python3") == "python"
+    cloned_lib = target / "lib/python3/site-packages/lib.py"
+    assert cloned_lib.stat().st_ino == site_packages.joinpath("lib.py").stat().st_ino
+    assert not target.joinpath(TEMPLATE_PREFIX_FILE).exists()
+
+
+def test_run_jobs_in_dependency_and_priority_order():
+    started = []
+    running = 0
+    max_running = 0
+
+    def make_job(name, requires=(), priority=0, fail=False):
+        async def func():
+            nonlocal running, max_running
+            started.append(name)
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if fail:
+                raise RuntimeError(name)
+            return name
+
+        return Job(name, func, requires, priority)
+
+    a = make_job("a")
+    b = make_job("b", priority=2)
+    c = make_job("c", [a, b], priority=1)
+    d = make_job("d", fail=True)
+    e = make_job("e", [d])
+    completed = []
+    asyncio.run(run_jobs([a, b, c, d, e], 1, completed.append))
+
+    assert started == ["b", "a", "c", "d"]
+    assert max_running == 1
+    assert c.state == "done" and c.result == "c"
+    assert isinstance(d.exception, RuntimeError)
+    assert isinstance(e.exception, DependencyFailed)
+    assert sorted(job.name for job in completed) == ["a", "b", "c", "d", "e"]
+
+
+def test_run_jobs_with_pool_limits():
+    running = {"": 0, "upload": 0}
+    max_running = {"": 0, "upload": 0}
+
+    def make_job(name, pool=""):
+        async def func():
+            running[pool] += 1
+            max_running[pool] = max(max_running[pool], running[pool])
+            await asyncio.sleep(0.01)
+            running[pool] -= 1
+
+        return Job(name, func, pool=pool)
+
+    jobs = [make_job(f"upload{i}", "upload") for i in range(4)]
+    jobs += [make_job(f"build{i}") for i in range(4)]
+    asyncio.run(run_jobs(jobs, 4, limits={"upload": 1}))
+    assert all(job.state == "done" for job in jobs)
+    assert max_running == {"": 3, "upload": 1}
+
+
+def test_async_run_command_streams_output_to_job():
+    async def func():
+        await async_run_command([sys.executable, "-c", "print('first'); print('last')"])
+
+    job = Job("echo", func)
+    asyncio.run(run_jobs([job], 1))
+    assert job.state == "done"
+    assert job.status == "last"
+
+    async def fail():
+        await async_run_command([sys.executable, "-c", "raise SystemExit(3)"])
+
+    job = Job("fail", fail)
+    asyncio.run(run_jobs([job], 1))
+    assert isinstance(job.exception, CommandError)
+    assert job.exception.returncode == 3
+
+
+def test_job_output_is_bounded_and_spilled_to_log(tmp_path):
+    async def func():
+        await async_run_command(
+            [sys.executable, "-c", "for i in range(200): print(f'line {i}')"]
+        )
+
+    job = Job("noisy", func)
+    asyncio.run(run_jobs([job], 1, log_dir=tmp_path))
+    assert list(job.output.lines) == [f"line {i}" for i in range(150, 200)]
+    log_lines = tmp_path.joinpath("noisy.log").read_text().splitlines()
+    assert log_lines == [f"line {i}" for i in range(200)]
+
+
+def test_async_run_command_long_lines_and_stale_logs(tmp_path):
+    tmp_path.joinpath("quiet.log").write_text("stale output\n")
+
+    async def long_line():
+        await async_run_command(
+            [sys.executable, "-c", "print('x' * 200000); print('done')"]
+        )
+
+    async def quiet():
+        pass
+
+    jobs = [Job("long", long_line), Job("quiet", quiet)]
+    asyncio.run(run_jobs(jobs, 2, log_dir=tmp_path))
+    assert jobs[0].state == "done"
+    assert jobs[0].status == "done"
+    lines = tmp_path.joinpath("long.log").read_text().splitlines()
+    assert [len(line) for line in lines] == [65536, 65536, 65536, 3392, 4]
+    assert not tmp_path.joinpath("quiet.log").exists()
+
+
+def test_async_run_command_splits_carriage_returns():
+    async def progress():
+        await async_run_command(
+            [
+                sys.executable,
+                "-c",
+                "import sys; sys.stdout.write('10%\\r50%\\r\\ndone\\r\\n')",
+            ]
+        )
+
+    job = Job("progress", progress)
+    asyncio.run(run_jobs([job], 1))
+    assert list(job.output.lines) == ["10%", "50%", "done"]
+
+
+def test_path_trie(tmp_path):
+    trie = PathTrie()
+    trie.insert(tmp_path / "foo", "foo")
+    trie.insert(tmp_path / "foo-more", "foo-more")
+    trie.insert(tmp_path / "foo" / "nested", "nested")
+    assert trie.find(tmp_path / "foo" / "nested" / "a.py") == ["foo", "nested"]
+    assert trie.find(tmp_path / "foo-more" / "a.py") == ["foo-more"]
+    assert trie.find(tmp_path / "foo") == ["foo"]
+    assert trie.find(tmp_path / "fo") == []
+    assert trie.find(tmp_path) == []
+
+
+def test_install_stamp_hashes_option_files(tmp_path):
+    constraints = tmp_path / "constraints.txt"
+    constraints.write_text("click>=7\n")
+    wheelhouse = tmp_path / "wheelhouse"
+    wheelhouse.mkdir()
+    options = [f"-c {constraints.as_posix()}", f"--find-links {wheelhouse.as_posix()}"]
+    stamp = get_install_stamp(options, [])
+    assert get_install_stamp(options, []) == stamp
+
+    constraints.write_text("click>=8\n")
+    new_stamp = get_install_stamp(options, [])
+    assert new_stamp != stamp
+
+    wheelhouse.joinpath("click-8.1.0-py3-none-any.whl").write_bytes(b"wheel")
+    assert get_install_stamp(options, []) != new_stamp
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX venv layout")
+def test_get_site_packages_of_broken_venv(tmp_path):
+    with pytest.raises(FileNotFoundError, match="No site-packages"):
+        get_site_packages(tmp_path)
@@ -0,0 +1,46 @@
+import pytest
+
+from monas.utils import run_command
+from monas.vcs import Git
+
+
+@pytest.fixture()
+def repo(tmp_path):
+    tmp_path.joinpath("pkg").mkdir()
+    tmp_path.joinpath("pkg", "a.py").write_text("a = 1\n")
+    for args in (
+        ["init"],
+        ["add", "."],
+        ["commit", "-m", "Initial commit"],
+        ["tag", "-a", "-m", "v1", "v1"],
+    ):
+        run_command(["git", *args], cwd=str(tmp_path))
+    repo = Git(tmp_path)
+    yield repo
+    repo.close()
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_read_refs(repo, packed):
+    if packed:
+        run_command(["git", "pack-refs", "--all"], cwd=repo.repo.working_dir)
+    head = repo.repo.git.rev_parse("HEAD")
+    assert repo.read_ref("HEAD") == head
+    assert repo.read_ref("refs/tags/v1") == repo.repo.git.rev_parse("v1")
+    assert repo.read_ref("refs/tags/v2") is None
+    # Annotated tags are peeled to the commit
+    assert repo.resolve_commit("v1") == head
+    assert repo.resolve_commit("HEAD") == head
+    with pytest.raises(ValueError):
+        repo.resolve_commit("v2")
+
+
+def test_get_tree_ids(repo):
+    tree = repo.repo.git.rev_parse("HEAD:pkg")
+    root = repo.repo.git.rev_parse("HEAD^{tree}")
+    assert repo.get_tree_ids("v1", ["pkg", "", "pkg/a.py", "missing"]) == [
+        tree,
+        root,
+        None,
+        None,
+    ]